@@ -0,0 +1,17 @@
+from django.apps import AppConfig
+from django.core.signals import request_started
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_migrate
+
+
+class ApiConfig(AppConfig):
+    name = 'api'
+
+    def ready(self):
+        from . import signals  # noqa: F401
+        from .db import check_connections
+        from .search import create_trigram_indexes, register_sqlite_like
+
+        post_migrate.connect(create_trigram_indexes, sender=self)
+        connection_created.connect(register_sqlite_like)
+        request_started.connect(check_connections)
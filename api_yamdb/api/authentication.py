@@ -0,0 +1,106 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.db import transaction
+from rest_framework_simplejwt.authentication import JWTTokenUserAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.models import TokenUser
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import AccessToken
+
+USER_CLAIMS = ('username', 'role', 'is_superuser', 'is_active')
+USER_CLAIMS_KEY = 'api:user_claims:{}'
+
+
+class RoleAccessToken(AccessToken):
+    """Access-токен с ролью пользователя в claims."""
+
+    @classmethod
+    def for_user(cls, user):
+        token = super().for_user(user)
+        for claim in USER_CLAIMS:
+            token[claim] = getattr(user, claim)
+        return token
+
+
+class RoleTokenUser(TokenUser):
+    """Пользователь, восстановленный из токена без запроса к базе."""
+
+    def __init__(self, token, claims=None):
+        super().__init__(token)
+        self.claims = {
+            claim: token.get(claim) for claim in USER_CLAIMS
+        }
+        self.claims.update(claims or {})
+
+    @property
+    def username(self):
+        return self.claims['username'] or ''
+
+    @property
+    def role(self):
+        return self.claims['role']
+
+    @property
+    def is_superuser(self):
+        return bool(self.claims['is_superuser'])
+
+    @property
+    def is_active(self):
+        return self.claims['is_active'] is not False
+
+
+def get_claims_cache():
+    return caches[settings.AUTH_CACHE_ALIAS]
+
+
+def set_user_claims(user_id, claims, replace=True):
+    cache = get_claims_cache()
+    (cache.set if replace else cache.add)(
+        USER_CLAIMS_KEY.format(user_id), claims,
+        timeout=settings.SIMPLE_JWT['ACCESS_TOKEN_LIFETIME'].total_seconds(),
+    )
+
+
+def remember_user_claims(user):
+    """Запоминает актуальные роль и статус, перекрывающие claims токенов,
+    после фиксации транзакции."""
+    claims = {claim: getattr(user, claim) for claim in USER_CLAIMS}
+    transaction.on_commit(lambda: set_user_claims(user.pk, claims))
+
+
+def forget_user(user_id):
+    set_user_claims(user_id, {'is_active': False})
+
+
+def get_user_claims(user_id):
+    """Актуальные claims пользователя. Если запись вытеснена из кэша,
+    они читаются из базы: роли из токена без подтверждения не доверяем."""
+    claims = get_claims_cache().get(USER_CLAIMS_KEY.format(user_id))
+    if claims is None:
+        user = get_user_model().objects.filter(pk=user_id).first()
+        if user is None:
+            claims = {'is_active': False}
+        else:
+            claims = {claim: getattr(user, claim) for claim in USER_CLAIMS}
+        # add не затирает claims, записанные сигналом после нашего чтения.
+        set_user_claims(user_id, claims, replace=False)
+    return claims
+
+
+class StatelessJWTAuthentication(JWTTokenUserAuthentication):
+    """JWT-аутентификация без загрузки пользователя из базы.
+
+    Роль и статус берутся из общего кэша, который обновляют сигналы при
+    изменении пользователя; при промахе кэша — из базы.
+    """
+
+    def get_user(self, validated_token):
+        super().get_user(validated_token)
+        user_id = validated_token[api_settings.USER_ID_CLAIM]
+        claims = get_user_claims(user_id)
+        user = RoleTokenUser(validated_token, claims)
+        if not user.is_active:
+            raise AuthenticationFailed('User is inactive',
+                                       code='user_inactive')
+        return user
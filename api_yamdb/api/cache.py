@@ -0,0 +1,95 @@
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.utils.http import urlencode
+
+VERSION_KEY = 'api:version:{}'
+MODIFIED_KEY = 'api:modified:{}'
+RESPONSE_KEY = 'api:response:{}'
+HITS_KEY = 'api:stats:hits'
+MISSES_KEY = 'api:stats:misses'
+
+
+def get_cache():
+    return caches[settings.API_CACHE_ALIAS]
+
+
+def get_versions(resources):
+    """Возвращает текущие версии ресурсов, заводя недостающие."""
+    cache = get_cache()
+    keys = [VERSION_KEY.format(resource) for resource in resources]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            # Стартуем с метки времени, чтобы версия не вернулась к
+            # старому значению после вытеснения ключа из кэша.
+            cache.add(key, int(time.time() * 1000), timeout=None)
+            versions[key] = cache.get(key)
+    return [versions[key] for key in keys]
+
+
+def bump_version(resource):
+    """Сбрасывает кэш ресурса после фиксации текущей транзакции: иначе
+    параллельный запрос успел бы сохранить ещё не зафиксированные данные
+    под новой версией."""
+    transaction.on_commit(lambda: _bump_version(resource))
+
+
+def _bump_version(resource):
+    cache = get_cache()
+    key = VERSION_KEY.format(resource)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, int(time.time() * 1000), timeout=None)
+    cache.set(MODIFIED_KEY.format(resource), int(time.time()), timeout=None)
+
+
+def get_last_modified(resources):
+    """Время последнего изменения ресурсов в секундах."""
+    cache = get_cache()
+    keys = [MODIFIED_KEY.format(resource) for resource in resources]
+    modified = cache.get_many(keys)
+    for key in keys:
+        if key not in modified:
+            # Время изменения неизвестно — считаем, что ресурс изменился
+            # сейчас.
+            cache.add(key, int(time.time()), timeout=None)
+            modified[key] = cache.get(key)
+    return max(modified.values(), default=None)
+
+
+def make_key(prefix, resources, request, kwargs):
+    """Ключ ответа по версиям ресурсов и нормализованной строке запроса."""
+    query = urlencode(sorted(
+        (name, sorted(values))
+        for name, values in request.query_params.lists()
+    ), doseq=True)
+    raw = '|'.join((
+        prefix,
+        ','.join(map(str, get_versions(resources))),
+        urlencode(sorted(kwargs.items())),
+        query,
+    ))
+    return RESPONSE_KEY.format(hashlib.md5(raw.encode()).hexdigest())
+
+
+def count(key, delta=1):
+    cache = get_cache()
+    if not cache.add(key, delta, timeout=None):
+        try:
+            cache.incr(key, delta)
+        except ValueError:
+            cache.set(key, delta, timeout=None)
+
+
+def cache_stats():
+    """Счётчики попаданий и промахов кэша ответов."""
+    stats = get_cache().get_many([HITS_KEY, MISSES_KEY])
+    return {
+        'hits': stats.get(HITS_KEY, 0),
+        'misses': stats.get(MISSES_KEY, 0),
+    }
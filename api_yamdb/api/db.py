@@ -0,0 +1,51 @@
+import random
+import threading
+
+from django.conf import settings
+from django.db import connections
+
+state = threading.local()
+
+
+def use_replica(enabled):
+    """Разрешает или запрещает текущему потоку читать с реплик. Реплика
+    выбирается один раз: все чтения запроса видят одно состояние базы."""
+    state.replica = None
+    if enabled and settings.DATABASE_REPLICAS:
+        state.replica = random.choice(settings.DATABASE_REPLICAS)
+
+
+def pin_primary():
+    use_replica(False)
+
+
+def reading_from_replica():
+    return getattr(state, 'replica', None) is not None
+
+
+def check_connections(**kwargs):
+    """Закрывает постоянные соединения, оборванные базой или пулером,
+    чтобы запрос открыл новое вместо падения на первом обращении."""
+    if not settings.DB_CONN_HEALTH_CHECKS:
+        return
+    for connection in connections.all():
+        if connection.connection is not None and not connection.is_usable():
+            connection.close()
+
+
+class ReplicaRouter:
+    """Чтения в безопасных запросах идут на реплики, всё остальное —
+    на основную базу. Вне запросов (команды, фоновые задачи) реплики
+    не используются."""
+
+    def db_for_read(self, model, **hints):
+        return getattr(state, 'replica', None) or 'default'
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == 'default'
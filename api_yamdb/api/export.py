@@ -0,0 +1,118 @@
+import csv
+import json
+from datetime import datetime
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+from reviews.models import Comment, Review
+from titles.models import Title
+
+from .models import Tombstone
+
+# Колонки совпадают с файлами, которые читает load_csv.
+EXPORTS = {
+    'titles': ('titles.csv', ('id', 'name', 'year', 'category_id')),
+    'genre_title': ('genre_title.csv', ('id', 'title_id', 'genre_id')),
+    'reviews': ('review.csv', (
+        'id', 'title_id', 'text', 'author_id', 'score', 'pub_date'
+    )),
+    'comments': ('comments.csv', (
+        'id', 'review_id', 'text', 'author_id', 'pub_date'
+    )),
+}
+# Поля, по которым из выгрузки исключаются мягко удалённые объекты.
+HIDDEN = {
+    'titles': {'id': Tombstone.TITLES},
+    'genre_title': {'title_id': Tombstone.TITLES},
+    'reviews': {'title_id': Tombstone.TITLES, 'author_id': Tombstone.USERS},
+    'comments': {
+        'review__title_id': Tombstone.TITLES,
+        'review__author_id': Tombstone.USERS,
+        'author_id': Tombstone.USERS,
+    },
+}
+FORMATS = {
+    'csv': 'text/csv; charset=utf-8',
+    'ndjson': 'application/x-ndjson',
+}
+
+
+def keyset_chunks(queryset, chunk_size):
+    """Выбирает строки пачками по id, не держа открытым курсор."""
+    last_id = 0
+    while True:
+        chunk = list(queryset.filter(id__gt=last_id)[:chunk_size])
+        if not chunk:
+            return
+        yield chunk
+        last = chunk[-1]
+        last_id = last['id'] if isinstance(last, dict) else last.id
+
+
+def visible(queryset, name):
+    for field, resource in HIDDEN[name].items():
+        queryset = Tombstone.objects.hide(queryset, resource, field)
+    return queryset
+
+
+def title_rows(chunk_size):
+    queryset = visible(Title.objects.all(), 'titles').select_related(
+        'category', 'stats'
+    ).prefetch_related('genre').order_by('id')
+    for chunk in keyset_chunks(queryset, chunk_size):
+        for title in chunk:
+            stats = getattr(title, 'stats', None)
+            yield {
+                'id': title.id,
+                'name': title.name,
+                'year': title.year,
+                'description': title.description,
+                'category_id': title.category_id,
+                'category': title.category.slug if title.category else None,
+                'genre': [genre.slug for genre in title.genre.all()],
+                'rating': stats.rating if stats else None,
+            }
+
+
+def value_rows(model, name, chunk_size):
+    queryset = visible(model.objects.all(), name).values(
+        *EXPORTS[name][1]).order_by('id')
+    for chunk in keyset_chunks(queryset, chunk_size):
+        yield from chunk
+
+
+def export_rows(name, chunk_size):
+    if name == 'titles':
+        return title_rows(chunk_size)
+    model = {
+        'genre_title': Title.genre.through,
+        'reviews': Review,
+        'comments': Comment,
+    }[name]
+    return value_rows(model, name, chunk_size)
+
+
+class Echo:
+    """Файлоподобный объект, возвращающий записанную строку."""
+
+    def write(self, value):
+        return value
+
+
+def export_lines(name, data_format, chunk_size=2000):
+    """Строки выгрузки таблицы name в формате csv или ndjson."""
+    rows = export_rows(name, chunk_size)
+    if data_format == 'ndjson':
+        for row in rows:
+            yield json.dumps(row, cls=DjangoJSONEncoder,
+                             ensure_ascii=False) + '\n'
+        return
+    columns = EXPORTS[name][1]
+    writer = csv.DictWriter(Echo(), fieldnames=columns, extrasaction='ignore')
+    yield writer.writerow(dict(zip(columns, columns)))
+    for row in rows:
+        yield writer.writerow({
+            column: value.isoformat() if isinstance(value, datetime)
+            else value
+            for column, value in row.items()
+        })
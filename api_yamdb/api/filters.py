@@ -1,4 +1,4 @@
-from django_filters.rest_framework import CharFilter, FilterSet
+from django_filters.rest_framework import CharFilter, FilterSet, OrderingFilter
 
 from titles.models import Title
 
@@ -6,12 +6,14 @@ from titles.models import Title
 class TitleFilter(FilterSet):
     """Фильтр по полям произведений."""
     name = CharFilter(field_name='name', lookup_expr='icontains')
-    category = CharFilter(
-        field_name='category__slug', lookup_expr='icontains'
-    )
-    genre = CharFilter(
-        field_name="genre__slug", lookup_expr='icontains'
-    )
+    category = CharFilter(field_name='category__slug')
+    genre = CharFilter(field_name='genre__slug')
+    ordering = OrderingFilter(fields=(
+        ('stats__rating', 'rating'),
+        ('stats__reviews_count', 'popularity'),
+        ('year', 'year'),
+        ('name', 'name'),
+    ))
 
     class Meta:
         model = Title
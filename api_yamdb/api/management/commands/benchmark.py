@@ -0,0 +1,229 @@
+import json
+import subprocess
+import time
+from contextlib import ExitStack
+from statistics import mean
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth.tokens import default_token_generator
+from django.core.management import BaseCommand, CommandError
+from django.db import connections, transaction
+from django.test import Client
+from rest_framework.throttling import SimpleRateThrottle
+
+from api.authentication import RoleAccessToken
+from api.cache import get_cache
+from api.metrics import percentile
+from api.middleware import QueryRecorder
+from api.throttling import SignupEmailRateThrottle, SignupRateThrottle
+from reviews.models import Review, TitleStats
+from titles.models import Category, Genre, Title
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = 'Benchmark API routes and print the results as JSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=50,
+                            help='Requests per scenario')
+        parser.add_argument('--username',
+                            help='Admin user for authenticated scenarios')
+        parser.add_argument('--cold', action='store_true',
+                            help='Clear the response cache before requests')
+        parser.add_argument('--output', help='Write JSON to this file')
+
+    def handle(self, *args, **options):
+        title = Title.objects.order_by('id').first()
+        review = Review.objects.order_by('id').first()
+        if title is None or review is None:
+            raise CommandError('Load data first (generate_csv, load_csv)')
+        self.client = Client()
+        self.options = options
+
+        # Без троттлинга: иначе auth-signup после трёх запросов мерил бы
+        # ответы 429, а счётчики в кэше пережили бы откат транзакции.
+        with mock.patch.dict(SimpleRateThrottle.THROTTLE_RATES, {
+            SignupRateThrottle.scope: None,
+            SignupEmailRateThrottle.scope: None,
+        }):
+            results = {
+                name: self.run(method, path, data)
+                for name, method, path, data in self.scenarios(title, review)
+            }
+        report = {
+            'commit': self.commit(),
+            'requests': options['requests'],
+            'cold': options['cold'],
+            'results': results,
+        }
+        output = json.dumps(report, indent=2, ensure_ascii=False)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                file.write(output)
+        self.stdout.write(output)
+
+    def scenarios(self, title, review):
+        page_size = settings.REST_FRAMEWORK['PAGE_SIZE']
+        last_title_page = max(1, Title.objects.count() // page_size)
+        popular = (
+            TitleStats.objects.order_by('-reviews_count').first()
+            or TitleStats(title=title)
+        )
+        last_review_page = max(1, popular.reviews_count // page_size)
+        category = Category.objects.order_by('id').first()
+        genre = Genre.objects.order_by('id').first()
+        title_url = f'/api/v1/titles/{title.id}/'
+        reviews_url = f'/api/v1/titles/{review.title_id}/reviews/'
+        comments_url = f'{reviews_url}{review.id}/comments/'
+        popular_url = f'/api/v1/titles/{popular.title_id}/reviews/'
+        scenarios = [
+            ('titles-list', 'get', '/api/v1/titles/', None),
+            ('titles-deep-page', 'get',
+             f'/api/v1/titles/?page={last_title_page}', None),
+            ('titles-filter-name', 'get',
+             f'/api/v1/titles/?name={title.name[:3]}', None),
+            ('titles-filter-year', 'get',
+             f'/api/v1/titles/?year={title.year}', None),
+            ('titles-retrieve', 'get', title_url, None),
+            ('categories-list', 'get', '/api/v1/categories/', None),
+            ('genres-list', 'get', '/api/v1/genres/', None),
+            ('reviews-list', 'get', reviews_url, None),
+            ('reviews-deep-page', 'get',
+             f'{popular_url}?page={last_review_page}', None),
+            ('reviews-cursor', 'get', f'{popular_url}?cursor=', None),
+            ('reviews-retrieve', 'get', f'{reviews_url}{review.id}/', None),
+            ('comments-list', 'get', comments_url, None),
+            ('changes-list', 'get', '/api/v1/changes/', None),
+            ('titles-similar', 'get', f'{title_url}similar/', None),
+            ('auth-signup', 'post', '/api/v1/auth/signup/', {
+                'username': 'benchmark', 'email': 'benchmark@yamdb.fake',
+            }),
+        ]
+        if category is not None:
+            scenarios.append(('titles-filter-category', 'get',
+                              f'/api/v1/titles/?category={category.slug}',
+                              None))
+            scenarios.append(('categories-search', 'get',
+                              f'/api/v1/categories/?search={category.name}',
+                              None))
+        if genre is not None:
+            scenarios.append(('titles-filter-genre', 'get',
+                              f'/api/v1/titles/?genre={genre.slug}', None))
+        if self.options['username']:
+            user = User.objects.get(username=self.options['username'])
+            token = RoleAccessToken.for_user(user)
+            self.client.defaults['HTTP_AUTHORIZATION'] = f'Bearer {token}'
+            scenarios.extend([
+                ('auth-token', 'post', '/api/v1/auth/token/', {
+                    'username': user.username,
+                    'confirmation_code':
+                        default_token_generator.make_token(user),
+                }),
+                ('users-list', 'get', '/api/v1/users/', None),
+                ('users-me', 'get', '/api/v1/users/me/', None),
+                ('users-retrieve', 'get',
+                 f'/api/v1/users/{user.username}/', None),
+                ('comments-create', 'post', comments_url,
+                 {'text': 'Benchmark'}),
+                ('categories-create', 'post', '/api/v1/categories/',
+                 self.new_slug),
+                ('categories-delete', 'delete',
+                 self.deleted_path(Category, '/api/v1/categories/'), None),
+                ('genres-create', 'post', '/api/v1/genres/', self.new_slug),
+                ('genres-delete', 'delete',
+                 self.deleted_path(Genre, '/api/v1/genres/'), None),
+                ('export-titles', 'get', '/api/v1/export/titles.csv', None),
+                ('export-reviews', 'get',
+                 '/api/v1/export/reviews.ndjson', None),
+            ])
+            # Отзыв на произведение можно оставить один раз, поэтому
+            # каждый запрос пишет отзыв на своё произведение.
+            unreviewed = list(Title.objects.exclude(
+                reviews__author=user).order_by('id').values_list(
+                'id', flat=True)[:self.options['requests']])
+            if unreviewed:
+                scenarios.append((
+                    'reviews-create', 'post',
+                    lambda number: '/api/v1/titles/'
+                    f'{unreviewed[number % len(unreviewed)]}/reviews/',
+                    {'text': 'Benchmark', 'score': 5},
+                ))
+            if category is not None and genre is not None:
+                item = {
+                    'name': 'Benchmark', 'year': 2000,
+                    'category': category.slug, 'genre': [genre.slug],
+                }
+                scenarios.extend([
+                    ('titles-create', 'post', '/api/v1/titles/', item),
+                    ('titles-bulk', 'post', '/api/v1/titles/bulk/',
+                     [{'id': title.id, 'name': title.name}] + [item] * 10),
+                ])
+        return scenarios
+
+    @staticmethod
+    def new_slug(number):
+        return {
+            'name': f'Benchmark {number}', 'slug': f'benchmark-{number}',
+        }
+
+    @staticmethod
+    def deleted_path(model, url):
+        """Путь к объекту, созданному для запроса на удаление: иначе
+        все запросы после первого получали бы 404."""
+        def path(number):
+            model.objects.create(**Command.new_slug(number))
+            return f'{url}benchmark-{number}/'
+        return path
+
+    def run(self, method, path, data):
+        latencies, queries, statuses = [], [], set()
+        cache = get_cache()
+        # Изменения, сделанные POST-сценариями, откатываются.
+        with transaction.atomic():
+            start = time.monotonic()
+            for number in range(self.options['requests']):
+                if self.options['cold']:
+                    cache.clear()
+                # Сценарий может задать путь и тело функцией номера
+                # запроса, если одинаковые запросы не повторяются.
+                url = path(number) if callable(path) else path
+                body = data(number) if callable(data) else data
+                recorder = QueryRecorder()
+                with ExitStack() as stack:
+                    for connection in connections.all():
+                        stack.enter_context(
+                            connection.execute_wrapper(recorder))
+                    request_start = time.monotonic()
+                    response = getattr(self.client, method)(
+                        url, body, content_type='application/json'
+                    ) if body else getattr(self.client, method)(url)
+                    if response.streaming:
+                        # Выгрузка читает базу, пока отдаётся ответ.
+                        for _ in response.streaming_content:
+                            pass
+                    latencies.append(time.monotonic() - request_start)
+                queries.append(recorder.count)
+                statuses.add(response.status_code)
+            elapsed = time.monotonic() - start
+            transaction.set_rollback(True)
+        latencies.sort()
+        return {
+            'path': url,
+            'statuses': sorted(statuses),
+            'p50_ms': round(percentile(latencies, 50) * 1000, 2),
+            'p95_ms': round(percentile(latencies, 95) * 1000, 2),
+            'p99_ms': round(percentile(latencies, 99) * 1000, 2),
+            'queries_per_request': mean(queries),
+            'requests_per_second': round(len(latencies) / elapsed, 1),
+        }
+
+    def commit(self):
+        try:
+            return subprocess.check_output(
+                ('git', 'rev-parse', 'HEAD'), cwd=settings.BASE_DIR,
+                stderr=subprocess.DEVNULL,
+            ).decode().strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
@@ -0,0 +1,26 @@
+import sys
+
+from django.core.management import BaseCommand
+
+from api.export import EXPORTS, FORMATS, export_lines
+
+
+class Command(BaseCommand):
+    help = 'Export a table as csv (load_csv layout) or ndjson'
+
+    def add_arguments(self, parser):
+        parser.add_argument('name', choices=EXPORTS)
+        parser.add_argument('--format', choices=FORMATS, default='csv')
+        parser.add_argument('--output', help='File path, stdout by default')
+        parser.add_argument('--chunk-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        lines = export_lines(
+            options['name'], options['format'], options['chunk_size'])
+        if options['output'] is None:
+            sys.stdout.writelines(lines)
+            return
+        with open(options['output'], 'w', encoding='utf-8',
+                  newline='') as output:
+            output.writelines(lines)
+        self.stderr.write(self.style.SUCCESS('Successfully exported data'))
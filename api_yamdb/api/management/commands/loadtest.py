@@ -0,0 +1,56 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from itertools import cycle
+from urllib.error import HTTPError
+from urllib.request import urlopen
+
+from django.core.management import BaseCommand
+
+from api.metrics import percentile
+
+PATHS = (
+    '/api/v1/titles/',
+    '/api/v1/titles/1/',
+    '/api/v1/titles/1/reviews/',
+    '/api/v1/titles/1/reviews/1/comments/',
+)
+
+
+class Command(BaseCommand):
+    help = 'Load test read endpoints of a running server'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='http://127.0.0.1:8000')
+        parser.add_argument('--concurrency', type=int, default=32)
+        parser.add_argument('--requests', type=int, default=2000)
+        parser.add_argument('--path', action='append', dest='paths')
+
+    def handle(self, *args, **options):
+        paths = cycle(options['paths'] or PATHS)
+        urls = [
+            options['url'] + next(paths) for _ in range(options['requests'])
+        ]
+        start = time.monotonic()
+        with ThreadPoolExecutor(options['concurrency']) as pool:
+            results = list(pool.map(self.fetch, urls))
+        elapsed = time.monotonic() - start
+
+        latencies = sorted(latency for latency, _ in results)
+        errors = sum(1 for _, status in results if status >= 400)
+        self.stdout.write(
+            f'{len(results)} requests in {elapsed:.2f}s, '
+            f'{len(results) / elapsed:.0f} req/s, {errors} errors\n'
+            f'p50 {percentile(latencies, 50) * 1000:.1f}ms, '
+            f'p95 {percentile(latencies, 95) * 1000:.1f}ms, '
+            f'p99 {percentile(latencies, 99) * 1000:.1f}ms'
+        )
+
+    def fetch(self, url):
+        start = time.monotonic()
+        try:
+            with urlopen(url) as response:
+                response.read()
+                status = response.status
+        except HTTPError as error:
+            status = error.code
+        return time.monotonic() - start, status
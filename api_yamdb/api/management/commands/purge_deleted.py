@@ -0,0 +1,75 @@
+import time
+
+from django.core.management import BaseCommand
+from django.db import transaction
+
+from api.models import Tombstone
+from reviews.models import Comment, Review, SimilarTitle
+from titles.models import Title
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = 'Purge soft-deleted users and titles in bounded batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument(
+            '--loop', action='store_true',
+            help='Keep polling for deleted objects instead of exiting'
+        )
+        parser.add_argument('--interval', type=float, default=5)
+
+    def handle(self, *args, **options):
+        self.batch_size = options['batch_size']
+        while True:
+            tombstones = list(Tombstone.objects.all())
+            for tombstone in tombstones:
+                self.purge(tombstone)
+                self.stdout.write(f'Purged {tombstone}')
+            if not options['loop']:
+                break
+            if not tombstones:
+                time.sleep(options['interval'])
+
+        self.stdout.write(self.style.SUCCESS(
+            'Successfully purged deleted objects'
+        ))
+
+    def purge(self, tombstone):
+        object_id = tombstone.object_id
+        if tombstone.resource == Tombstone.TITLES:
+            self.purge_reviews(Review.objects.filter(title_id=object_id))
+            self.delete_batches(
+                SimilarTitle.objects.filter(similar_id=object_id))
+            model = Title
+        else:
+            self.purge_reviews(Review.objects.filter(author_id=object_id))
+            self.delete_batches(Comment.objects.filter(author_id=object_id))
+            model = User
+        # Зависимых строк почти не осталось, каскад уже ничего
+        # не загружает.
+        with transaction.atomic():
+            model.objects.filter(pk=object_id).delete()
+            tombstone.delete()
+
+    def delete_batches(self, queryset):
+        while True:
+            ids = list(queryset.order_by().values_list(
+                'id', flat=True)[:self.batch_size])
+            if not ids:
+                return
+            with transaction.atomic():
+                queryset.model.objects.filter(id__in=ids).delete()
+
+    def purge_reviews(self, reviews):
+        """Удаляет отзывы пачками, сначала — пачками комментарии к ним.
+        Статистику произведений поправляют сигналы удаления."""
+        while True:
+            ids = list(reviews.order_by().values_list(
+                'id', flat=True)[:self.batch_size])
+            if not ids:
+                return
+            self.delete_batches(Comment.objects.filter(review_id__in=ids))
+            with transaction.atomic():
+                Review.objects.filter(id__in=ids).delete()
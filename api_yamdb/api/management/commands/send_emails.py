@@ -0,0 +1,105 @@
+import time
+from datetime import timedelta
+from smtplib import SMTPException
+
+from django.conf import settings
+from django.contrib.auth.tokens import default_token_generator
+from django.core.mail import EmailMessage, get_connection
+from django.core.management import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from api.models import ConfirmationEmail
+
+# Предельная пауза между попытками подключиться к почтовому серверу.
+MAX_OUTAGE_DELAY = 300
+
+
+class Command(BaseCommand):
+    help = 'Send queued confirmation codes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100)
+        parser.add_argument(
+            '--loop', action='store_true',
+            help='Keep polling the queue instead of exiting when it is empty'
+        )
+        parser.add_argument('--interval', type=float, default=5)
+
+    def handle(self, *args, **options):
+        outages = 0
+        while True:
+            result = self.send_batch(options['batch_size'])
+            if result is None:
+                if not options['loop']:
+                    raise CommandError('Mail server is unavailable')
+                outages += 1
+                time.sleep(min(
+                    options['interval'] * 2 ** outages, MAX_OUTAGE_DELAY
+                ))
+                continue
+            outages = 0
+            sent, failed = result
+            if sent or failed:
+                self.stdout.write(f'Sent: {sent}, failed: {failed}')
+            if not options['loop']:
+                break
+            if not sent and not failed:
+                time.sleep(options['interval'])
+
+        self.stdout.write(self.style.SUCCESS('Successfully sent emails'))
+
+    def send_batch(self, batch_size):
+        sent = failed = 0
+        with transaction.atomic():
+            # Блокируем только письма: строки пользователей нужны для
+            # чтения, и их не должна держать рассылка.
+            emails = list(
+                ConfirmationEmail.objects.select_for_update(
+                    skip_locked=True, of=('self',))
+                .select_related('user')
+                .filter(next_attempt__lte=timezone.now())[:batch_size]
+            )
+            if not emails:
+                return sent, failed
+            connection = get_connection()
+            try:
+                connection.open()
+            except (SMTPException, OSError) as error:
+                self.stderr.write(f'Cannot connect to mail server: {error}')
+                return None
+            try:
+                for email in emails:
+                    message = EmailMessage(
+                        'confirmation code',
+                        default_token_generator.make_token(email.user),
+                        settings.MAILING_EMAIL,
+                        [email.email],
+                        connection=connection,
+                    )
+                    try:
+                        message.send()
+                    except (SMTPException, OSError):
+                        failed += 1
+                        self.retry_or_drop(email)
+                    else:
+                        sent += 1
+                        email.delete()
+            finally:
+                connection.close()
+        return sent, failed
+
+    def retry_or_drop(self, email):
+        email.attempts += 1
+        if email.attempts >= settings.EMAIL_QUEUE_MAX_ATTEMPTS:
+            # Удаляем только пользователя, созданного этой регистрацией;
+            # у существующего просто отбрасываем письмо.
+            if email.new_user:
+                email.user.delete()
+            else:
+                email.delete()
+            return
+        email.next_attempt = timezone.now() + timedelta(
+            seconds=settings.EMAIL_QUEUE_RETRY_DELAY * 2 ** email.attempts
+        )
+        email.save(update_fields=('attempts', 'next_attempt'))
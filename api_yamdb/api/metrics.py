@@ -0,0 +1,115 @@
+import ipaddress
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.http import Http404, HttpResponse
+
+from .cache import cache_stats, count, get_cache
+
+# Имя, тип, описание и множитель: в общем кэше счётчики целые, поэтому
+# секунды хранятся в микросекундах.
+METRICS = (
+    ('api_requests_total', 'counter', 'Requests served', 1),
+    ('api_request_duration_seconds_total', 'counter', 'Request latency',
+     10 ** 6),
+    ('api_db_queries_total', 'counter', 'SQL queries executed', 1),
+    ('api_db_duration_seconds_total', 'counter', 'Time spent in SQL',
+     10 ** 6),
+    ('api_response_bytes_total', 'counter', 'Response payload size', 1),
+    ('api_query_budget_exceeded_total', 'counter',
+     'Requests over the query budget', 1),
+)
+VIEWS_KEY = 'api:metrics:views'
+METRIC_KEY = 'api:metrics:{}:{}'
+
+
+class Registry:
+    """Счётчики запросов по вьюхам. Процесс копит приращения в памяти
+    и раз в METRICS_FLUSH_INTERVAL секунд переносит их в общий кэш, так
+    что /metrics/ любого воркера отдаёт сумму по всем воркерам."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pending = self.new_values()
+        self.flushed = time.monotonic()
+
+    def new_values(self):
+        return defaultdict(lambda: [0] * len(METRICS))
+
+    def observe(self, view, *values):
+        with self.lock:
+            row = self.pending[view]
+            for index, value in enumerate(values):
+                row[index] += value
+            now = time.monotonic()
+            if now - self.flushed < settings.METRICS_FLUSH_INTERVAL:
+                return
+            pending, self.pending = self.pending, self.new_values()
+            self.flushed = now
+        self.flush(pending)
+
+    def flush(self, pending):
+        cache = get_cache()
+        views = set(cache.get(VIEWS_KEY) or ())
+        if not views.issuperset(pending):
+            # Гонка с другим воркером может потерять имя вьюхи, но оно
+            # вернётся при его следующем сбросе.
+            cache.set(VIEWS_KEY, sorted(views | set(pending)), timeout=None)
+        for view, row in pending.items():
+            for index, value in enumerate(row):
+                delta = round(value * METRICS[index][3])
+                if delta:
+                    count(METRIC_KEY.format(view, index), delta)
+
+    def render(self):
+        cache = get_cache()
+        views = sorted(cache.get(VIEWS_KEY) or ())
+        values = cache.get_many([
+            METRIC_KEY.format(view, index)
+            for view in views for index in range(len(METRICS))
+        ])
+        lines = []
+        for index, (name, kind, description, scale) in enumerate(METRICS):
+            lines.append(f'# HELP {name} {description}')
+            lines.append(f'# TYPE {name} {kind}')
+            for view in views:
+                value = values.get(METRIC_KEY.format(view, index), 0)
+                if scale != 1:
+                    value /= scale
+                lines.append(f'{name}{{view="{view}"}} {value}')
+        for name, value in cache_stats().items():
+            lines.append(f'# TYPE api_cache_{name}_total counter')
+            lines.append(f'api_cache_{name}_total {value}')
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+
+def percentile(values, percent):
+    """Перцентиль отсортированного списка замеров."""
+    index = min(len(values) - 1, int(len(values) * percent / 100))
+    return values[index]
+
+
+def is_allowed(address):
+    try:
+        address = ipaddress.ip_address(address)
+    except ValueError:
+        return False
+    return any(
+        address in ipaddress.ip_network(network.strip(), strict=False)
+        for network in settings.METRICS_ALLOWED_IPS
+    )
+
+
+def metrics(request):
+    """Метрики в формате Prometheus, доступны только с адресов и сетей
+    из METRICS_ALLOWED_IPS."""
+    if not is_allowed(request.META.get('REMOTE_ADDR', '')):
+        raise Http404
+    return HttpResponse(
+        registry.render(), content_type='text/plain; version=0.0.4'
+    )
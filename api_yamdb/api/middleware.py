@@ -0,0 +1,121 @@
+import hashlib
+import logging
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+from rest_framework.permissions import SAFE_METHODS
+
+from .cache import get_cache
+from .db import use_replica
+from .metrics import registry
+
+logger = logging.getLogger(__name__)
+
+
+class QueryRecorder:
+    def __init__(self):
+        self.count = 0
+        self.duration = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.monotonic()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.duration += time.monotonic() - start
+
+
+def get_view_name(request, view_func):
+    """Имя вьюхи: basename роутера и action для вьюсетов."""
+    initkwargs = getattr(view_func, 'initkwargs', None)
+    actions = getattr(view_func, 'actions', None)
+    if initkwargs and actions:
+        action = actions.get(request.method.lower(), request.method.lower())
+        return f"{initkwargs.get('basename')}-{action}"
+    return getattr(view_func, '__name__', 'unknown')
+
+
+class MetricsMiddleware:
+    """Считает время ответа, число и время SQL-запросов и размер ответа
+    по каждой вьюхе и пишет в лог запросы сверх бюджета API_QUERY_BUDGETS.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        recorder = QueryRecorder()
+        start = time.monotonic()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(recorder))
+            response = self.get_response(request)
+        duration = time.monotonic() - start
+
+        view = getattr(request, 'metrics_view', None)
+        if view is None:
+            return response
+        budget = settings.API_QUERY_BUDGETS.get(
+            view, settings.API_DEFAULT_QUERY_BUDGET)
+        over_budget = budget is not None and recorder.count > budget
+        if over_budget:
+            logger.warning(
+                '%s %s: %d queries (budget %d), %.1f ms in db',
+                view, request.get_full_path(), recorder.count, budget,
+                recorder.duration * 1000,
+            )
+        registry.observe(
+            view, 1, duration, recorder.count, recorder.duration,
+            0 if response.streaming else len(response.content),
+            int(over_budget),
+        )
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request.metrics_view = get_view_name(request, view_func)
+
+
+class ReplicaMiddleware:
+    """Отправляет чтения безопасных запросов на реплики. После записи
+    клиент DATABASE_REPLICA_LAG секунд читает с основной базы, чтобы
+    видеть свои изменения; клиент узнаётся по токену или по cookie.
+    Метка по токену хранится в общем кэше, так что её видят все воркеры."""
+    cookie_name = 'use_primary'
+    sticky_key = 'api:primary:{}'
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        safe = request.method in SAFE_METHODS
+        use_replica(safe and not self.is_sticky(request))
+        try:
+            response = self.get_response(request)
+        finally:
+            use_replica(False)
+        if not safe and response.status_code < 400:
+            self.make_sticky(request, response)
+        return response
+
+    def get_client_key(self, request):
+        authorization = request.META.get('HTTP_AUTHORIZATION')
+        if not authorization:
+            return None
+        return self.sticky_key.format(
+            hashlib.sha1(authorization.encode()).hexdigest())
+
+    def is_sticky(self, request):
+        if self.cookie_name in request.COOKIES:
+            return True
+        key = self.get_client_key(request)
+        return key is not None and get_cache().get(key) is not None
+
+    def make_sticky(self, request, response):
+        lag = settings.DATABASE_REPLICA_LAG
+        key = self.get_client_key(request)
+        if key is not None:
+            get_cache().set(key, 1, timeout=lag)
+        response.set_cookie(self.cookie_name, '1', max_age=lag)
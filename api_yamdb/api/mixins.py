@@ -1,8 +1,106 @@
+import time
+
+from django.conf import settings
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
 from rest_framework.mixins import (CreateModelMixin, DestroyModelMixin,
                                    ListModelMixin)
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.response import Response
 from rest_framework.viewsets import GenericViewSet
 
+from .cache import (HITS_KEY, MISSES_KEY, count, get_cache,
+                    get_last_modified, make_key)
+from .db import pin_primary
+from .serializers import query_param_list
+
 
 class GetListCreateDeleteMixin(GenericViewSet, CreateModelMixin,
                                ListModelMixin, DestroyModelMixin):
     pass
+
+
+class ConditionalListMixin:
+    """Отдаёт ETag и Last-Modified для list по версиям ресурсов
+    cache_resources и отвечает 304 без запросов к базе."""
+    cache_resources = ()
+
+    def get_cache_resources(self):
+        return self.cache_resources
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(super().list, request, *args, **kwargs)
+
+    def cached_response(self, handler, request, *args, **kwargs):
+        resources = self.get_cache_resources()
+        key = make_key(
+            f'{request.get_host()}:{self.basename}:{self.action}',
+            resources, request, kwargs,
+        )
+        etag = 'W/"{}"'.format(key.rsplit(':', 1)[-1])
+        last_modified = get_last_modified(resources)
+        if time.time() - last_modified < settings.DATABASE_REPLICA_LAG:
+            # Реплики могут ещё не догнать изменение: ответ с них попал бы
+            # в кэш и в ETag новой версии.
+            pin_primary()
+        response = get_conditional_response(
+            request, etag=etag, last_modified=last_modified)
+        if response is None:
+            response = self.get_response(key, handler, request,
+                                         *args, **kwargs)
+        if response.status_code in (200, 304):
+            response['ETag'] = etag
+            response['Last-Modified'] = http_date(last_modified)
+            response['X-Accel-Expires'] = settings.API_PROXY_CACHE_TTL
+        return response
+
+    def get_response(self, key, handler, request, *args, **kwargs):
+        return handler(request, *args, **kwargs)
+
+
+class CachedListMixin(ConditionalListMixin):
+    """Кэширует ответы list до изменения ресурсов cache_resources."""
+    cache_timeout = settings.API_CACHE_TIMEOUT
+
+    def get_response(self, key, handler, request, *args, **kwargs):
+        cache = get_cache()
+        data = cache.get(key)
+        if data is not None:
+            count(HITS_KEY)
+            return Response(data)
+        count(MISSES_KEY)
+        response = handler(request, *args, **kwargs)
+        if response.status_code == 200:
+            cache.set(key, response.data, timeout=self.cache_timeout)
+        return response
+
+
+class CachedListRetrieveMixin(CachedListMixin):
+    """Кэширует ответы list и retrieve."""
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(
+            super().retrieve, request, *args, **kwargs)
+
+
+class SparseFieldsViewMixin:
+    """При ?fields= не загружает из базы колонки deferrable_fields и
+    связи prefetch_fields, не попавшие в запрос."""
+    deferrable_fields = ()
+    prefetch_fields = ()
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        fields = query_param_list(self.request, 'fields')
+        if not fields or self.request.method not in SAFE_METHODS:
+            return queryset
+        deferred = [
+            name for name in self.deferrable_fields if name not in fields
+        ]
+        if deferred:
+            queryset = queryset.defer(*deferred)
+        if any(name not in fields for name in self.prefetch_fields):
+            queryset = queryset.prefetch_related(None).prefetch_related(*(
+                name for name in self.prefetch_fields if name in fields
+            ))
+        return queryset
@@ -0,0 +1,103 @@
+from django.db import models
+from django.utils import timezone
+
+from users.models import User
+
+
+class ConfirmationEmail(models.Model):
+    """Письмо с кодом подтверждения, ожидающее отправки."""
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name='confirmation_emails',
+        verbose_name='пользователь')
+    email = models.EmailField(verbose_name='Адрес', max_length=254)
+    # Пользователь создан этой регистрацией и ещё не получал токен: только
+    # такого можно удалить, если письмо так и не удалось отправить.
+    new_user = models.BooleanField(
+        verbose_name='Новый пользователь', default=False)
+    attempts = models.PositiveSmallIntegerField(
+        verbose_name='Попыток отправки', default=0)
+    next_attempt = models.DateTimeField(
+        verbose_name='Следующая попытка', default=timezone.now,
+        db_index=True)
+    created = models.DateTimeField(
+        verbose_name='Дата создания', auto_now_add=True)
+
+    class Meta:
+        ordering = ['next_attempt', 'id']
+        verbose_name = 'Письмо с кодом подтверждения'
+        verbose_name_plural = 'Письма с кодом подтверждения'
+
+    def __str__(self):
+        return f'{self.email}, {self.attempts}'
+
+
+class Change(models.Model):
+    """Запись журнала изменений каталога, отзывов и комментариев."""
+    CREATED = 'created'
+    UPDATED = 'updated'
+    DELETED = 'deleted'
+    ACTIONS = (
+        (CREATED, 'Создан'),
+        (UPDATED, 'Изменён'),
+        (DELETED, 'Удалён'),
+    )
+
+    resource = models.CharField(verbose_name='Ресурс', max_length=20)
+    object_id = models.BigIntegerField(verbose_name='id объекта')
+    action = models.CharField(
+        verbose_name='Действие', max_length=7, choices=ACTIONS)
+    created = models.DateTimeField(
+        verbose_name='Дата изменения', auto_now_add=True)
+
+    class Meta:
+        ordering = ['id']
+        verbose_name = 'Изменение'
+        verbose_name_plural = 'Изменения'
+
+    def __str__(self):
+        return f'{self.resource}, {self.object_id}, {self.action}'
+
+
+class TombstoneQuerySet(models.QuerySet):
+    def ids(self, resource):
+        """Подзапрос id удалённых, но ещё не вычищенных объектов."""
+        return self.filter(resource=resource).values('object_id')
+
+    def hide(self, queryset, resource, field='id'):
+        """queryset без строк, у которых field ссылается на удалённый
+        объект resource."""
+        return queryset.exclude(**{f'{field}__in': self.ids(resource)})
+
+
+class Tombstone(models.Model):
+    """Мягко удалённый пользователь или произведение: объект скрыт из API
+    сразу, а его отзывы и комментарии удаляет пачками команда
+    purge_deleted."""
+    TITLES = 'titles'
+    USERS = 'users'
+    RESOURCES = (
+        (TITLES, 'Произведение'),
+        (USERS, 'Пользователь'),
+    )
+
+    resource = models.CharField(
+        verbose_name='Ресурс', max_length=20, choices=RESOURCES)
+    object_id = models.BigIntegerField(verbose_name='id объекта')
+    created = models.DateTimeField(
+        verbose_name='Дата удаления', auto_now_add=True)
+
+    objects = TombstoneQuerySet.as_manager()
+
+    class Meta:
+        ordering = ['id']
+        verbose_name = 'Удалённый объект'
+        verbose_name_plural = 'Удалённые объекты'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['resource', 'object_id'],
+                name='unique_tombstone'
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.resource}, {self.object_id}'
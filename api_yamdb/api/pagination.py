@@ -0,0 +1,143 @@
+from base64 import b64decode, b64encode
+from binascii import Error as BinasciiError
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class PubDateKeysetPagination(PageNumberPagination):
+    """Постраничный вывод по номеру страницы или по курсору.
+
+    Если в запросе передан параметр cursor (для первой страницы — пустой),
+    выдача идёт по ключу (pub_date, id) без COUNT(*) и OFFSET.
+    """
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Неверный курсор.'
+    ordering = ('-pub_date', '-id')
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset = self.cursor_query_param in request.query_params
+        if not self.keyset:
+            return super().paginate_queryset(queryset, request, view)
+
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        queryset = queryset.order_by(*self.ordering)
+        position = self.decode_cursor(
+            request.query_params[self.cursor_query_param])
+        if position is not None:
+            pub_date, pk = position
+            # Избыточное pub_date <= задаёт границу диапазона в индексе
+            # (…, pub_date, id): одно OR PostgreSQL применил бы фильтром
+            # ко всем строкам новее курсора.
+            queryset = queryset.filter(
+                Q(pub_date__lt=pub_date) | Q(pub_date=pub_date, id__lt=pk),
+                pub_date__lte=pub_date,
+            )
+        results = list(queryset[:self.page_size + 1])
+        self.has_next = len(results) > self.page_size
+        self.page = results[:self.page_size]
+        return self.page
+
+    def get_paginated_response(self, data):
+        if not self.keyset:
+            return super().get_paginated_response(data)
+        return Response({
+            'next': self.get_next_link(),
+            'results': data,
+        })
+
+    def get_next_link(self):
+        if not self.keyset:
+            return super().get_next_link()
+        if not self.has_next:
+            return None
+        last = self.page[-1]
+        return replace_query_param(
+            self.request.build_absolute_uri(),
+            self.cursor_query_param,
+            self.encode_cursor(last.pub_date, last.id),
+        )
+
+    def get_previous_link(self):
+        if self.keyset:
+            return None
+        return super().get_previous_link()
+
+    def encode_cursor(self, pub_date, pk):
+        raw = f'{pub_date.isoformat()}|{pk}'
+        return b64encode(raw.encode()).decode()
+
+    def decode_cursor(self, cursor):
+        if not cursor:
+            return None
+        try:
+            pub_date, pk = b64decode(cursor.encode()).decode().split('|')
+            pub_date, pk = parse_datetime(pub_date), int(pk)
+        except (BinasciiError, UnicodeDecodeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        if pub_date is None:
+            raise NotFound(self.invalid_cursor_message)
+        return pub_date, pk
+
+
+class ChangeFeedPagination(BasePagination):
+    """Выдача журнала изменений после id из параметра since.
+
+    id записи выдаётся при INSERT, а видна она становится при COMMIT, так
+    что запись с меньшим id может появиться позже записи с большим. Чтобы
+    клиент не прошёл мимо неё, отдаются только записи старше
+    CHANGE_FEED_DELAY секунд — дольше этого транзакции не длятся.
+    """
+    cursor_query_param = 'since'
+    page_size_query_param = 'limit'
+    page_size = 100
+    max_page_size = 1000
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        try:
+            self.since = int(request.query_params.get(
+                self.cursor_query_param, 0))
+            page_size = max(1, min(
+                int(request.query_params.get(
+                    self.page_size_query_param, self.page_size)),
+                self.max_page_size,
+            ))
+        except ValueError:
+            raise NotFound('Неверный курсор.')
+        settled = timezone.now() - timedelta(
+            seconds=settings.CHANGE_FEED_DELAY)
+        results = list(
+            queryset.filter(id__gt=self.since, created__lte=settled)
+            .order_by('id')[:page_size + 1]
+        )
+        self.has_next = len(results) > page_size
+        self.page = results[:page_size]
+        return self.page
+
+    def get_cursor(self):
+        return self.page[-1].id if self.page else self.since
+
+    def get_paginated_response(self, data):
+        return Response({
+            'cursor': self.get_cursor(),
+            'next': self.get_next_link(),
+            'results': data,
+        })
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        return replace_query_param(
+            self.request.build_absolute_uri(),
+            self.cursor_query_param,
+            self.get_cursor(),
+        )
@@ -16,10 +16,17 @@ class IsAdminUserOrReadOnly(BasePermission):
 class IsAuthorOrReadOnly(BasePermission):
     def has_object_permission(self, request, view, obj):
         return (request.method in SAFE_METHODS
-                or obj.author == request.user)
+                or obj.author_id == request.user.id)
 
 
 class IsModeratorOrReadOnly(BasePermission):
     def has_object_permission(self, request, view, obj):
         return (request.method in SAFE_METHODS
                 or request.user.role == 'moderator')
+
+
+class IsAdmin(BasePermission):
+    def has_permission(self, request, view):
+        return (request.user.is_authenticated
+                and (request.user.role == 'admin'
+                     or request.user.is_superuser))
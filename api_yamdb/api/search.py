@@ -0,0 +1,70 @@
+import re
+from functools import lru_cache
+
+from django.db import connections
+
+from titles.models import Category, Genre, Title
+
+# Поля, по которым идёт поиск через icontains (TitleFilter и SearchFilter).
+SEARCH_FIELDS = (
+    (Title, 'name'),
+    (Category, 'name'),
+    (Category, 'slug'),
+    (Genre, 'name'),
+    (Genre, 'slug'),
+)
+
+
+def create_trigram_indexes(using, **kwargs):
+    """Создаёт в PostgreSQL триграммные GIN-индексы под icontains.
+
+    Django строит icontains как UPPER("поле"::text) LIKE UPPER(...),
+    поэтому индекс строится по тому же выражению и подхватывается
+    планировщиком без изменения запросов.
+    """
+    connection = connections[using]
+    if connection.vendor != 'postgresql':
+        return
+    quote = connection.ops.quote_name
+    with connection.cursor() as cursor:
+        cursor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        for model, name in SEARCH_FIELDS:
+            table = model._meta.db_table
+            column = model._meta.get_field(name).column
+            cursor.execute(
+                f'CREATE INDEX IF NOT EXISTS '
+                f'{quote(f"{table}_{column}_trgm")} ON {quote(table)} '
+                f'USING gin (UPPER({quote(column)}::text) gin_trgm_ops)'
+            )
+
+
+@lru_cache(maxsize=256)
+def like_to_regex(pattern, escape):
+    regex = []
+    chars = iter(pattern)
+    for char in chars:
+        if char == escape:
+            regex.append(re.escape(next(chars, '')))
+        elif char == '%':
+            regex.append('.*')
+        elif char == '_':
+            regex.append('.')
+        else:
+            regex.append(re.escape(char))
+    return re.compile(''.join(regex), re.DOTALL | re.IGNORECASE)
+
+
+def like(pattern, value, escape=None):
+    if pattern is None or value is None:
+        return None
+    return like_to_regex(pattern, escape).fullmatch(str(value)) is not None
+
+
+def register_sqlite_like(connection, **kwargs):
+    """Встроенный LIKE в SQLite не учитывает регистр только для ASCII;
+    заменяем его на Python-реализацию, чтобы поиск по кириллице в тестах
+    вёл себя так же, как в PostgreSQL."""
+    if connection.vendor != 'sqlite':
+        return
+    connection.connection.create_function('like', 2, like)
+    connection.connection.create_function('like', 3, like)
@@ -1,29 +1,83 @@
 from django.contrib.auth.validators import UnicodeUsernameValidator
-from django.db.models import Avg
-from django.forms import ValidationError
-from django.shortcuts import get_object_or_404
+from django.db.models import Manager, Q
 from rest_framework import serializers
+from rest_framework.fields import SkipField
+from rest_framework.permissions import SAFE_METHODS
 
-from reviews.models import Comment, Review
+from reviews.models import Comment, Review, TitleStats
 from titles.models import Category, Genre, Title
 from users.models import User
+
+from .models import Change
 from users.validators import meUsername
 
 
-class GenreSerializer(serializers.ModelSerializer):
+def query_param_list(request, name):
+    """Значения параметра вида ?fields=id,name в виде множества."""
+    if request is None or not request.query_params.get(name):
+        return set()
+    return set(request.query_params[name].split(','))
+
+
+class LeanListSerializer(serializers.ListSerializer):
+    """Список для чтения: поля дочернего сериализатора собираются один раз,
+    а строки выдаются простыми словарями."""
+
+    def to_representation(self, data):
+        iterable = data.all() if isinstance(data, Manager) else data
+        fields = [
+            (field.field_name, field.get_attribute, field.to_representation)
+            for field in self.child._readable_fields
+        ]
+        rows = []
+        for instance in iterable:
+            row = {}
+            for name, get_attribute, to_representation in fields:
+                try:
+                    attribute = get_attribute(instance)
+                except SkipField:
+                    continue
+                row[name] = (
+                    None if attribute is None
+                    else to_representation(attribute)
+                )
+            rows.append(row)
+        return rows
+
+
+class SparseFieldsMixin:
+    """Оставляет в ответе поля из ?fields= и добавляет поля
+    Meta.expandable_fields, только если они перечислены в ?expand=."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        request = self.context.get('request')
+        expand = query_param_list(request, 'expand')
+        for name in getattr(self.Meta, 'expandable_fields', ()):
+            if name not in expand:
+                self.fields.pop(name, None)
+        fields = query_param_list(request, 'fields')
+        if fields and request.method in SAFE_METHODS:
+            for name in set(self.fields) - fields:
+                self.fields.pop(name)
+
+
+class GenreSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """Сериализатор для жанра."""
 
     class Meta:
         exclude = ('id',)
         model = Genre
+        list_serializer_class = LeanListSerializer
 
 
-class CategorySerializer(serializers.ModelSerializer):
+class CategorySerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """Сериализатор для категории."""
 
     class Meta:
         exclude = ('id',)
         model = Category
+        list_serializer_class = LeanListSerializer
 
 
 class TitleSerializer(serializers.ModelSerializer):
@@ -42,24 +96,54 @@ class TitleSerializer(serializers.ModelSerializer):
         model = Title
 
 
-class TitleGetSerializer(serializers.ModelSerializer):
+class TitleBulkSerializer(serializers.ModelSerializer):
+    """Элемент массового создания или изменения произведений: категория
+    и жанры передаются слагами и проверяются одним запросом на весь
+    список."""
+    id = serializers.IntegerField(required=False)
+    category = serializers.SlugField(required=True)
+    genre = serializers.ListField(
+        child=serializers.SlugField(), required=True, allow_empty=False)
+
+    class Meta:
+        fields = ('id', 'name', 'year', 'description', 'genre', 'category')
+        model = Title
+
+
+class TitleStatsSerializer(serializers.ModelSerializer):
+    """Сериализатор для статистики отзывов на произведение."""
+
+    class Meta:
+        fields = ('reviews_count', 'comments_count', 'scores')
+        model = TitleStats
+
+
+class TitleGetSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     category = CategorySerializer(read_only=True)
     genre = GenreSerializer(many=True, read_only=True)
     rating = serializers.SerializerMethodField()
+    stats = serializers.SerializerMethodField()
 
     class Meta:
         model = Title
         fields = (
-            'id', 'name', 'description', 'year', 'category', 'genre', 'rating'
+            'id', 'name', 'description', 'year', 'category', 'genre',
+            'rating', 'stats'
         )
         read_only_fields = ('id',)
+        expandable_fields = ('stats',)
+        list_serializer_class = LeanListSerializer
 
     def get_rating(self, obj):
-        obj = obj.reviews.all().aggregate(rating=Avg('score'))
-        return obj['rating']
+        stats = getattr(obj, 'stats', None)
+        return stats.rating if stats else None
 
+    def get_stats(self, obj):
+        stats = getattr(obj, 'stats', None) or TitleStats()
+        return TitleStatsSerializer(stats).data
 
-class ReviewSerializer(serializers.ModelSerializer):
+
+class ReviewSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     author = serializers.SlugRelatedField(
         slug_field='username',
         read_only=True,
@@ -70,18 +154,6 @@ class ReviewSerializer(serializers.ModelSerializer):
         read_only=True
     )
 
-    def validate(self, data):
-        request = self.context['request']
-        title_id = self.context['view'].kwargs.get('title_id')
-        title = get_object_or_404(Title, pk=title_id)
-        if request.method == 'POST':
-            if Review.objects.filter(
-                    title=title,
-                    author=request.user).exists():
-                raise ValidationError(
-                    'Допустимо не более 1 отзыва на произведение')
-        return data
-
     def validate_score(self, score):
         if score < 1 or score > 10:
             raise serializers.ValidationError(
@@ -91,9 +163,10 @@ class ReviewSerializer(serializers.ModelSerializer):
     class Meta:
         fields = '__all__'
         model = Review
+        list_serializer_class = LeanListSerializer
 
 
-class CommentSerializer(serializers.ModelSerializer):
+class CommentSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     author = serializers.SlugRelatedField(
         read_only=True, slug_field='username'
     )
@@ -104,9 +177,19 @@ class CommentSerializer(serializers.ModelSerializer):
     class Meta:
         fields = '__all__'
         model = Comment
+        list_serializer_class = LeanListSerializer
+
+
+class ChangeSerializer(serializers.ModelSerializer):
+    """Сериализатор для журнала изменений."""
+
+    class Meta:
+        fields = ('id', 'resource', 'object_id', 'action', 'created')
+        model = Change
+        list_serializer_class = LeanListSerializer
 
 
-class UserSerializer(serializers.ModelSerializer):
+class UserSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """Serializer модели User."""
 
     class Meta:
@@ -114,6 +197,7 @@ class UserSerializer(serializers.ModelSerializer):
         fields = (
             'username', 'email', 'first_name', 'last_name', 'bio', 'role',
         )
+        list_serializer_class = LeanListSerializer
 
 
 class CreateUserSerializer(serializers.Serializer):
@@ -133,18 +217,22 @@ class CreateUserSerializer(serializers.Serializer):
     def validate(self, data):
         username = data.get('username')
         email = data.get('email')
-        if (
-                User.objects.filter(username=username).exists()
-                and User.objects.get(username=username).email != email
+        users = list(User.objects.filter(
+            Q(username=username) | Q(email=email)
+        ).only('username', 'email'))
+        if any(
+                user.username == username and user.email != email
+                for user in users
         ):
             raise serializers.ValidationError(
                 'Пользователь с таким username уже зарегистрирован')
-        if (
-                User.objects.filter(email=email).exists()
-                and User.objects.get(email=email).username != username
+        if any(
+                user.email == email and user.username != username
+                for user in users
         ):
             raise serializers.ValidationError(
                 'Указанная почта уже зарегестрирована другим пользователем')
+        data['user'] = users[0] if users else None
         return data
 
 
@@ -0,0 +1,180 @@
+from django.db.models import Subquery
+from django.db.models.signals import (m2m_changed, post_delete, post_init,
+                                      post_save)
+from django.dispatch import receiver
+
+from reviews.models import Comment, Review, TitleStats
+from titles.models import Category, Genre, Title
+from users.models import User
+
+from .authentication import forget_user, remember_user_claims
+from .cache import bump_version
+from .models import Change, Tombstone
+
+RESOURCES = {
+    Category: 'categories',
+    Genre: 'genres',
+    Title: 'titles',
+    Review: 'reviews',
+    Comment: 'comments',
+}
+
+
+def bump_resource_version(sender, **kwargs):
+    bump_version(RESOURCES[sender])
+
+
+# Приёмники подключаются к конкретным моделям: приёмник без sender
+# отключил бы быстрое удаление QuerySet.delete() для всех моделей.
+for model in RESOURCES:
+    post_save.connect(bump_resource_version, sender=model)
+    post_delete.connect(bump_resource_version, sender=model)
+
+
+def record_save(sender, instance, created, **kwargs):
+    Change.objects.create(
+        resource=RESOURCES[sender], object_id=instance.pk,
+        action=Change.CREATED if created else Change.UPDATED,
+    )
+
+
+def record_delete(sender, instance, **kwargs):
+    resource = RESOURCES[sender]
+    if resource == Tombstone.TITLES and Tombstone.objects.filter(
+            resource=resource, object_id=instance.pk).exists():
+        # Удаление записано в журнал при мягком удалении, purge_deleted
+        # только вычищает строку.
+        return
+    Change.objects.create(
+        resource=resource, object_id=instance.pk, action=Change.DELETED)
+
+
+for model in RESOURCES:
+    post_save.connect(record_save, sender=model)
+    post_delete.connect(record_delete, sender=model)
+
+
+@receiver(m2m_changed, sender=Title.genre.through)
+def bump_title_genres_version(sender, instance, action, reverse, pk_set,
+                              **kwargs):
+    if not action.startswith('post_'):
+        return
+    bump_version('titles')
+    if reverse:
+        title_ids = pk_set or ()
+    else:
+        title_ids = (instance.pk,)
+    Change.objects.bulk_create(
+        Change(resource='titles', object_id=title_id, action=Change.UPDATED)
+        for title_id in title_ids
+    )
+
+
+@receiver(post_save, sender=Review)
+@receiver(post_delete, sender=Review)
+def bump_title_reviews_version(sender, instance, **kwargs):
+    bump_version(f'reviews:{instance.title_id}')
+
+
+@receiver(post_save, sender=Review)
+@receiver(post_delete, sender=Review)
+def record_title_rating_change(sender, instance, **kwargs):
+    # Рейтинг произведения хранится в TitleStats и меняется вместе
+    # с отзывами: клиентам журнала нужно перечитать произведение.
+    Change.objects.create(
+        resource='titles', object_id=instance.title_id,
+        action=Change.UPDATED)
+
+
+@receiver(post_init, sender=Review)
+def remember_review_score(sender, instance, **kwargs):
+    # Произведение и оценка до изменения; отложенные поля не загружаем.
+    instance.saved_score = (
+        instance.__dict__.get('title_id'), instance.__dict__.get('score'))
+
+
+@receiver(post_save, sender=Review)
+def update_stats_on_review_save(sender, instance, created, raw=False,
+                                **kwargs):
+    if raw:
+        return
+    title_id, score = instance.saved_score
+    if created:
+        TitleStats.objects.add_score(instance.title_id, instance.score)
+    elif None in (title_id, score):
+        pass
+    elif title_id != instance.title_id:
+        comments = instance.comments.count()
+        TitleStats.objects.remove_score(title_id, score, comments)
+        TitleStats.objects.add_score(instance.title_id, instance.score)
+        TitleStats.objects.add_comment(instance.title_id, comments)
+    else:
+        TitleStats.objects.change_score(
+            instance.title_id, score, instance.score)
+    instance.saved_score = (instance.title_id, instance.score)
+
+
+@receiver(post_delete, sender=Review)
+def update_stats_on_review_delete(sender, instance, **kwargs):
+    # Комментарии к отзыву удаляются каскадом раньше и вычитаются
+    # своим сигналом.
+    TitleStats.objects.remove_score(instance.title_id, instance.score)
+
+
+@receiver(post_save, sender=Comment)
+def update_stats_on_comment_save(sender, instance, created, raw=False,
+                                 **kwargs):
+    if created and not raw:
+        TitleStats.objects.add_comment(instance.review.title_id)
+
+
+@receiver(post_delete, sender=Comment)
+def update_stats_on_comment_delete(sender, instance, **kwargs):
+    if Comment.review.is_cached(instance):
+        title_id = instance.review.title_id
+    else:
+        # При каскадном удалении отзыв не загружен: обходимся подзапросом
+        # вместо отдельного SELECT на каждый комментарий.
+        title_id = Subquery(Review.objects.filter(
+            pk=instance.review_id).values('title_id')[:1])
+    TitleStats.objects.remove_comment(title_id)
+
+
+@receiver(post_delete, sender=Review)
+def bump_deleted_review_comments_version(sender, instance, **kwargs):
+    bump_version(f'comments:{instance.pk}')
+
+
+@receiver(post_delete, sender=Title)
+def bump_deleted_title_reviews_version(sender, instance, **kwargs):
+    bump_version(f'reviews:{instance.pk}')
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def bump_review_comments_version(sender, instance, **kwargs):
+    bump_version(f'comments:{instance.review_id}')
+
+
+@receiver(post_save, sender=User)
+def refresh_user_claims(sender, instance, **kwargs):
+    remember_user_claims(instance)
+
+
+@receiver(post_init, sender=User)
+def remember_username(sender, instance, **kwargs):
+    instance.saved_username = instance.__dict__.get('username')
+
+
+@receiver(post_save, sender=User)
+def bump_users_version(sender, instance, created, raw=False, **kwargs):
+    # Имя автора входит в ответы с отзывами и комментариями.
+    if raw or created or instance.username == instance.saved_username:
+        return
+    instance.saved_username = instance.username
+    bump_version('users')
+
+
+@receiver(post_delete, sender=User)
+def revoke_user_claims(sender, instance, **kwargs):
+    forget_user(instance.pk)
@@ -0,0 +1,51 @@
+from unittest import mock
+
+from django.conf import settings
+from django.core.cache import caches
+from django.test import TestCase
+from rest_framework.pagination import PageNumberPagination
+
+from reviews.models import Review
+from titles.models import Category, Genre, Title
+from users.models import User
+
+
+class TitleListQueriesTest(TestCase):
+    """Страница списка произведений загружается за фиксированное число
+    запросов: COUNT, произведения с категорией и рейтингом, жанры."""
+    url = '/api/v1/titles/'
+    queries = 3
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Фильм', slug='movie')
+        genres = [
+            Genre.objects.create(name=f'Жанр {number}', slug=f'genre-{number}')
+            for number in range(3)
+        ]
+        author = User.objects.create(
+            username='author', email='author@yamdb.fake')
+        for number in range(12):
+            title = Title.objects.create(
+                name=f'Произведение {number}', year=2000, category=category)
+            title.genre.set(genres[:number % 3 + 1])
+            score = number % 10 + 1
+            Review.objects.create(
+                title=title, author=author, text='Текст', score=score)
+
+    def setUp(self):
+        # Иначе второй запрос получит ответ из кэша без обращения к базе.
+        caches[settings.API_CACHE_ALIAS].clear()
+
+    def assert_page_queries(self, page_size):
+        with mock.patch.object(PageNumberPagination, 'page_size', page_size):
+            with self.assertNumQueries(self.queries):
+                response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), page_size)
+
+    def test_small_page(self):
+        self.assert_page_queries(2)
+
+    def test_large_page(self):
+        self.assert_page_queries(10)
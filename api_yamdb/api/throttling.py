@@ -0,0 +1,30 @@
+from rest_framework.throttling import SimpleRateThrottle
+
+from .cache import get_cache
+
+
+class SignupRateThrottle(SimpleRateThrottle):
+    """Ограничение регистраций с одного IP."""
+    scope = 'signup'
+    cache = get_cache()
+
+    def get_cache_key(self, request, view):
+        return self.cache_format % {
+            'scope': self.scope,
+            'ident': self.get_ident(request),
+        }
+
+
+class SignupEmailRateThrottle(SimpleRateThrottle):
+    """Ограничение запросов кода на один адрес почты."""
+    scope = 'signup_email'
+    cache = get_cache()
+
+    def get_cache_key(self, request, view):
+        email = request.data.get('email')
+        if not isinstance(email, str) or not email:
+            return None
+        return self.cache_format % {
+            'scope': self.scope,
+            'ident': email.strip().lower(),
+        }
@@ -1,9 +1,9 @@
 from django.urls import include, path
 from rest_framework.routers import DefaultRouter
 
-from .views import (CategoryViewSet, CommentViewSet, GenreViewSet,
-                    ReviewViewSet, TitleViewSet, UserViewSet, create_token,
-                    create_user)
+from .views import (CategoryViewSet, ChangeViewSet, CommentViewSet,
+                    GenreViewSet, ReviewViewSet, TitleViewSet, UserViewSet,
+                    create_token, create_user, export_data)
 
 app_name = 'api'
 
@@ -21,9 +21,11 @@ router.register(
 router.register(r'titles', TitleViewSet, basename='titles')
 router.register(r'genres', GenreViewSet, basename='genres')
 router.register(r'users', UserViewSet, basename='users')
+router.register(r'changes', ChangeViewSet, basename='changes')
 
 urlpatterns = [
     path('v1/', include(router.urls)),
+    path('v1/export/<slug:name>.<slug:extension>', export_data),
     path('v1/auth/', include([
         path('token/', create_token),
         path('signup/', create_user)
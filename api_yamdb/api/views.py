@@ -1,52 +1,209 @@
-from smtplib import SMTPResponseException
-
-from django.conf import settings
 from django.contrib.auth.tokens import default_token_generator
-from django.core.mail import send_mail
+from django.db import IntegrityError, connection, transaction
+from django.http import Http404, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
+from django.utils.functional import cached_property
 
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import filters, status, viewsets, permissions
-from rest_framework.decorators import action, api_view, permission_classes
+from rest_framework.decorators import (action, api_view, permission_classes,
+                                       throttle_classes)
 from rest_framework.permissions import (
     AllowAny, IsAuthenticated, IsAuthenticatedOrReadOnly
 )
+from rest_framework.exceptions import ValidationError
+from rest_framework.mixins import ListModelMixin
 from rest_framework.response import Response
-from rest_framework_simplejwt.tokens import AccessToken
+from rest_framework.settings import api_settings
+from rest_framework_simplejwt.authentication import JWTAuthentication
 from rest_framework.permissions import AllowAny
 
-from reviews.models import Review
+from reviews.models import Review, SimilarTitle
 from titles.models import Category, Genre, Title
 from users.models import User
 from users.permissions import IsAdminUser
 
+from .authentication import RoleAccessToken, forget_user
+from .cache import bump_version
+from .export import EXPORTS, FORMATS, export_lines
 from .filters import TitleFilter
-from .mixins import GetListCreateDeleteMixin
+from .models import Change, ConfirmationEmail, Tombstone
+from .mixins import (CachedListMixin, CachedListRetrieveMixin,
+                     ConditionalListMixin, GetListCreateDeleteMixin,
+                     SparseFieldsViewMixin)
+from .pagination import ChangeFeedPagination, PubDateKeysetPagination
 from .permissions import (
-    IsModeratorOrReadOnly, IsAuthorOrReadOnly, IsAdminUserOrReadOnly
+    IsAdmin, IsModeratorOrReadOnly, IsAuthorOrReadOnly, IsAdminUserOrReadOnly
 )
-from .serializers import (CategorySerializer, CommentSerializer,
-                          CreateTokenSerializer, CreateUserSerializer,
-                          GenreSerializer, ReviewSerializer,
-                          TitleGetSerializer, TitleSerializer, UserSerializer)
+from .serializers import (CategorySerializer, ChangeSerializer,
+                          CommentSerializer, CreateTokenSerializer,
+                          CreateUserSerializer, GenreSerializer,
+                          ReviewSerializer, TitleBulkSerializer,
+                          TitleGetSerializer, TitleSerializer, UserSerializer,
+                          query_param_list)
+from .throttling import SignupEmailRateThrottle, SignupRateThrottle
 
 
-class TitleViewSet(viewsets.ModelViewSet):
+class TitleViewSet(SparseFieldsViewMixin, CachedListRetrieveMixin,
+                   viewsets.ModelViewSet):
     """Вьюсет для произведения."""
-    queryset = Title.objects.all()
+    queryset = Tombstone.objects.hide(
+        Title.objects.all(), Tombstone.TITLES
+    ).select_related('category', 'stats').prefetch_related('genre')
     serializer_class = TitleSerializer
     filter_backends = [DjangoFilterBackend]
     filterset_class = TitleFilter
     permission_classes = [IsAdminUserOrReadOnly, ]
+    cache_resources = ('titles', 'categories', 'genres', 'reviews')
+    deferrable_fields = ('description',)
+    prefetch_fields = ('genre',)
+
+    def get_cache_resources(self):
+        if 'stats' in query_param_list(self.request, 'expand'):
+            return self.cache_resources + ('comments',)
+        return self.cache_resources
 
     def get_serializer_class(self):
         if self.request.method in ('POST', 'PATCH',):
             return TitleSerializer
         return TitleGetSerializer
 
+    def perform_destroy(self, instance):
+        """Скрывает произведение; отзывы и комментарии удалит пачками
+        команда purge_deleted."""
+        with transaction.atomic():
+            Tombstone.objects.get_or_create(
+                resource=Tombstone.TITLES, object_id=instance.pk)
+            Change.objects.create(
+                resource='titles', object_id=instance.pk,
+                action=Change.DELETED)
+        bump_version('titles')
+        bump_version(f'reviews:{instance.pk}')
+        # Списки комментариев к отзывам произведения теперь отвечают 404.
+        bump_version('tombstones')
+
+    @action(detail=False, methods=['POST'])
+    def bulk(self, request):
+        """Массовое создание (элементы без id) и изменение (с id)
+        произведений одной транзакцией."""
+        if not isinstance(request.data, list):
+            raise ValidationError({api_settings.NON_FIELD_ERRORS_KEY: [
+                'Ожидается список произведений'
+            ]})
+        items, errors = [], []
+        for data in request.data:
+            if not isinstance(data, dict):
+                errors.append({api_settings.NON_FIELD_ERRORS_KEY: [
+                    'Ожидается объект'
+                ]})
+                continue
+            serializer = TitleBulkSerializer(data=data, partial='id' in data)
+            if serializer.is_valid():
+                items.append(serializer.validated_data)
+                errors.append({})
+            else:
+                errors.append(serializer.errors)
+        categories = {
+            category.slug: category for category in Category.objects.filter(
+                slug__in={item['category'] for item in items
+                          if 'category' in item})
+        }
+        genres = {
+            genre.slug: genre.id for genre in Genre.objects.filter(
+                slug__in={slug for item in items
+                          for slug in item.get('genre', ())})
+        }
+        titles = Tombstone.objects.hide(
+            Title.objects.all(), Tombstone.TITLES
+        ).in_bulk([item['id'] for item in items if 'id' in item])
+        valid_errors = [error for error in errors if not error]
+        for item, error in zip(items, valid_errors):
+            if 'id' in item and item['id'] not in titles:
+                error['id'] = ['Произведение не найдено']
+            if 'category' in item and item['category'] not in categories:
+                error['category'] = ['Категория не найдена']
+            missing = [
+                slug for slug in item.get('genre', ()) if slug not in genres
+            ]
+            if missing:
+                error['genre'] = [f'Жанр не найден: {slug}'
+                                  for slug in missing]
+        if any(errors):
+            return Response(errors, status=status.HTTP_400_BAD_REQUEST)
+
+        created, updated, fields, genre_rows = [], [], set(), []
+        for item in items:
+            values = {
+                name: value for name, value in item.items()
+                if name not in ('id', 'genre')
+            }
+            if 'category' in values:
+                values['category'] = categories[values['category']]
+            if 'id' in item:
+                title = titles[item['id']]
+                for name, value in values.items():
+                    setattr(title, name, value)
+                fields.update(values)
+                updated.append(title)
+            else:
+                title = Title(**values)
+                created.append(title)
+            if 'genre' in item:
+                genre_rows.append((title, item['genre']))
+
+        with transaction.atomic():
+            if connection.features.can_return_ids_from_bulk_insert:
+                Title.objects.bulk_create(created)
+            else:
+                for title in created:
+                    title.save()
+            if updated and fields:
+                Title.objects.bulk_update(updated, fields)
+            through = Title.genre.through
+            through.objects.filter(title_id__in=[
+                item['id'] for item in items
+                if 'id' in item and 'genre' in item
+            ]).delete()
+            through.objects.bulk_create(
+                through(title_id=title.id, genre_id=genres[slug])
+                for title, slugs in genre_rows for slug in set(slugs)
+            )
+            Change.objects.bulk_create(
+                Change(resource='titles', object_id=title.id, action=action)
+                for titles, action in (
+                    (created, Change.CREATED), (updated, Change.UPDATED)
+                )
+                for title in titles
+            )
+        bump_version('titles')
+
+        queryset = self.get_queryset().filter(
+            id__in=[title.id for title in created + updated])
+        return Response(
+            TitleGetSerializer(
+                queryset, many=True, context=self.get_serializer_context()
+            ).data,
+            status=status.HTTP_200_OK,
+        )
+
+    @action(detail=True)
+    def similar(self, request, pk=None):
+        """Похожие произведения из индекса, который строит команда
+        build_similar_titles."""
+        title = self.get_object()
+        ids = list(SimilarTitle.objects.filter(title_id=title.pk).order_by(
+            'rank').values_list('similar_id', flat=True))
+        titles = self.filter_queryset(self.get_queryset()).in_bulk(ids)
+        serializer = TitleGetSerializer(
+            [titles[title_id] for title_id in ids if title_id in titles],
+            many=True, context=self.get_serializer_context(),
+        )
+        return Response(serializer.data)
+
 
-class CategoryViewSet(GetListCreateDeleteMixin):
+class CategoryViewSet(CachedListMixin, GetListCreateDeleteMixin):
     """Вьюсет для категории."""
+    cache_resources = ('categories',)
     queryset = Category.objects.all()
     serializer_class = CategorySerializer
     permission_classes = [IsAdminUserOrReadOnly, ]
@@ -55,8 +212,9 @@ class CategoryViewSet(GetListCreateDeleteMixin):
     lookup_field = 'slug'
 
 
-class GenreViewSet(GetListCreateDeleteMixin):
+class GenreViewSet(CachedListMixin, GetListCreateDeleteMixin):
     """Вьюсет для жанра."""
+    cache_resources = ('genres',)
     queryset = Genre.objects.all()
     serializer_class = GenreSerializer
     permission_classes = [IsAdminUserOrReadOnly, ]
@@ -65,42 +223,108 @@ class GenreViewSet(GetListCreateDeleteMixin):
     lookup_field = 'slug'
 
 
-class ReviewViewSet(viewsets.ModelViewSet):
+class ReviewViewSet(SparseFieldsViewMixin, ConditionalListMixin,
+                    viewsets.ModelViewSet):
     serializer_class = ReviewSerializer
+    deferrable_fields = ('text',)
+    pagination_class = PubDateKeysetPagination
     permission_classes = [
         IsAuthenticatedOrReadOnly,
         IsAuthorOrReadOnly | IsModeratorOrReadOnly | IsAdminUserOrReadOnly
     ]
 
+    def get_cache_resources(self):
+        return (
+            f"reviews:{self.kwargs.get('title_id')}", 'tombstones', 'users')
+
+    @cached_property
+    def title(self):
+        return get_object_or_404(
+            Tombstone.objects.hide(Title.objects.all(), Tombstone.TITLES),
+            id=self.kwargs.get('title_id'),
+        )
+
     def get_queryset(self):
-        title = get_object_or_404(Title, id=self.kwargs.get('title_id'))
-        return title.reviews.all()
+        return Tombstone.objects.hide(
+            self.title.reviews.all(), Tombstone.USERS, 'author_id'
+        ).select_related('author')
 
     def perform_create(self, serializer):
-        title_id = self.kwargs.get('title_id')
-        title = get_object_or_404(Title, id=title_id)
-        serializer.save(title=title, author=self.request.user)
+        try:
+            with transaction.atomic():
+                serializer.save(
+                    title=self.title, author_id=self.request.user.id)
+        except IntegrityError:
+            # Сообщаем о повторном отзыве, только если нарушен именно
+            # unique_review; прочие ошибки целостности не маскируем.
+            if not self.title.reviews.filter(
+                    author_id=self.request.user.id).exists():
+                raise
+            raise ValidationError({api_settings.NON_FIELD_ERRORS_KEY: [
+                'Допустимо не более 1 отзыва на произведение'
+            ]})
+
+    def perform_update(self, serializer):
+        with transaction.atomic():
+            serializer.save()
 
+    def perform_destroy(self, instance):
+        with transaction.atomic():
+            instance.delete()
 
-class CommentViewSet(viewsets.ModelViewSet):
+
+class CommentViewSet(SparseFieldsViewMixin, ConditionalListMixin,
+                     viewsets.ModelViewSet):
     serializer_class = CommentSerializer
+    deferrable_fields = ('text',)
+    pagination_class = PubDateKeysetPagination
     permission_classes = [
         IsAuthenticatedOrReadOnly,
         IsAuthorOrReadOnly | IsModeratorOrReadOnly | IsAdminUserOrReadOnly
     ]
 
+    def get_cache_resources(self):
+        return (
+            f"comments:{self.kwargs.get('review_id')}", 'tombstones', 'users')
+
+    @cached_property
+    def review(self):
+        reviews = Tombstone.objects.hide(
+            Review.objects.all(), Tombstone.TITLES, 'title_id')
+        return get_object_or_404(
+            Tombstone.objects.hide(reviews, Tombstone.USERS, 'author_id'),
+            id=self.kwargs.get('review_id'),
+            title_id=self.kwargs.get('title_id'),
+        )
+
     def get_queryset(self):
-        review = get_object_or_404(Review, id=self.kwargs.get('review_id'))
-        return review.comments.all()
+        return Tombstone.objects.hide(
+            self.review.comments.all(), Tombstone.USERS, 'author_id'
+        ).select_related('author')
 
     def perform_create(self, serializer):
-        review = get_object_or_404(Review, id=self.kwargs.get('review_id'))
-        serializer.save(author=self.request.user, review=review)
+        with transaction.atomic():
+            serializer.save(author_id=self.request.user.id, review=self.review)
+
+    def perform_destroy(self, instance):
+        with transaction.atomic():
+            instance.delete()
+
+
+class ChangeViewSet(ListModelMixin, viewsets.GenericViewSet):
+    """Журнал изменений для синхронизации клиентов."""
+    queryset = Change.objects.all()
+    serializer_class = ChangeSerializer
+    pagination_class = ChangeFeedPagination
+    permission_classes = [AllowAny, ]
+    filter_backends = [DjangoFilterBackend]
+    filterset_fields = ('resource',)
 
 
 class UserViewSet(viewsets.ModelViewSet):
     """ViewSet модели User."""
-    queryset = User.objects.all()
+    queryset = Tombstone.objects.hide(User.objects.all(), Tombstone.USERS)
+    authentication_classes = (JWTAuthentication,)
     permission_classes = (IsAdminUser,)
     serializer_class = UserSerializer
     filter_backends = (filters.SearchFilter,)
@@ -108,6 +332,17 @@ class UserViewSet(viewsets.ModelViewSet):
     search_fields = ('username',)
     http_method_names = ['get', 'post', 'patch', 'delete']
 
+    def perform_destroy(self, instance):
+        """Блокирует и скрывает пользователя; его отзывы и комментарии
+        удалит пачками команда purge_deleted."""
+        with transaction.atomic():
+            Tombstone.objects.get_or_create(
+                resource=Tombstone.USERS, object_id=instance.pk)
+            User.objects.filter(pk=instance.pk).update(is_active=False)
+        forget_user(instance.pk)
+        # Отзывы и комментарии пользователя скрываются из всех списков.
+        bump_version('tombstones')
+
     @action(
         detail=False,
         methods=(['GET', 'PATCH']),
@@ -129,30 +364,27 @@ class UserViewSet(viewsets.ModelViewSet):
 
 @api_view(['POST'])
 @permission_classes([AllowAny])
+@throttle_classes([SignupRateThrottle, SignupEmailRateThrottle])
 def create_user(request):
     """Создание нового пользователя."""
     serializer = CreateUserSerializer(data=request.data)
     serializer.is_valid(raise_exception=True)
     username = serializer.validated_data.get('username')
     email = serializer.validated_data.get('email')
-    user, _ = User.objects.get_or_create(username=username, email=email)
-    token = default_token_generator.make_token(user)
-
+    user = serializer.validated_data.get('user')
     try:
-        send_mail(
-            'confirmation code',
-            token,
-            settings.MAILING_EMAIL,
-            [email],
-            fail_silently=False,
-        )
-        return Response(data=serializer.data, status=status.HTTP_200_OK)
-    except SMTPResponseException:
-        user.delete()
-        return Response(
-            data={'error': 'Ошибка при отправки кода подтверждения!'},
-            status=status.HTTP_500_INTERNAL_SERVER_ERROR,
-        )
+        with transaction.atomic():
+            new_user = user is None
+            if new_user:
+                user = User.objects.create(username=username, email=email)
+            ConfirmationEmail.objects.create(
+                user=user, email=email, new_user=new_user)
+    except IntegrityError:
+        # Параллельная регистрация заняла username или почту.
+        raise ValidationError({api_settings.NON_FIELD_ERRORS_KEY: [
+            'Пользователь с таким username или почтой уже зарегистрирован'
+        ]})
+    return Response(data=serializer.data, status=status.HTTP_200_OK)
 
 
 @api_view(["POST"])
@@ -167,7 +399,22 @@ def create_token(request):
     if default_token_generator.check_token(
         user, serializer.validated_data["confirmation_code"]
     ):
-        token = AccessToken.for_user(user)
+        token = RoleAccessToken.for_user(user)
+        ConfirmationEmail.objects.filter(user=user, new_user=True).update(
+            new_user=False)
         return Response({"token": str(token)}, status=status.HTTP_200_OK)
 
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+
+@api_view(['GET'])
+@permission_classes([IsAdmin])
+def export_data(request, name, extension):
+    """Потоковая выгрузка таблицы в csv или ndjson."""
+    if name not in EXPORTS or extension not in FORMATS:
+        raise Http404
+    response = StreamingHttpResponse(
+        export_lines(name, extension), content_type=FORMATS[extension])
+    response['Content-Disposition'] = (
+        f'attachment; filename="{name}.{extension}"')
+    return response
@@ -31,6 +31,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'api.middleware.MetricsMiddleware',
+    'api.middleware.ReplicaMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -70,9 +72,99 @@ DATABASES = {
         'USER': os.getenv('POSTGRES_USER'),
         'PASSWORD': os.getenv('POSTGRES_PASSWORD'),
         'HOST': os.getenv('DB_HOST'),
-        'PORT': os.getenv('DB_PORT')
+        'PORT': os.getenv('DB_PORT'),
+        # Время жизни постоянного соединения в секундах, 0 — закрывать
+        # после каждого запроса. Каждый поток gunicorn держит своё
+        # соединение: workers * threads (gunicorn.conf.py) должно быть
+        # меньше max_connections Postgres (100) за вычетом прочих
+        # клиентов, иначе нужен пулер (профиль pooler в docker-compose).
+        'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', default=60)),
+        # Пулер в режиме transaction не сохраняет серверные курсоры
+        # между транзакциями.
+        'DISABLE_SERVER_SIDE_CURSORS':
+            os.getenv('DB_POOL_MODE') == 'transaction',
     }
-} 
+}
+
+# Реплики для чтения: DB_REPLICA_HOSTS=host1,host2. Для проверки на одной
+# машине можно указать тот же хост, что и у основной базы.
+DATABASE_REPLICAS = []
+for number, host in enumerate(
+        filter(None, os.getenv('DB_REPLICA_HOSTS', default='').split(',')),
+        start=1
+):
+    DATABASES[f'replica{number}'] = {
+        **DATABASES['default'],
+        'HOST': host.strip(),
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS.append(f'replica{number}')
+
+DATABASE_ROUTERS = ['api.db.ReplicaRouter']
+
+# Сколько секунд после записи читать с основной базы.
+DATABASE_REPLICA_LAG = int(os.getenv('DB_REPLICA_LAG', default=10))
+
+# Проверять открытые соединения SELECT 1 в начале каждого HTTP-запроса —
+# в том числе отвеченного из кэша или 304 — поэтому выключено. Включать,
+# если пулер или база рвут простаивающие соединения раньше CONN_MAX_AGE.
+DB_CONN_HEALTH_CHECKS = os.getenv('DB_CONN_HEALTH_CHECKS', default='0') == '1'
+
+# Cache
+
+# Версии ресурсов и счётчики должны быть общими для всех воркеров
+# gunicorn: в docker-compose это redis (django_redis.cache.RedisCache,
+# redis://redis:6379/0). LocMemCache годится только для одного процесса —
+# gunicorn.conf.py не стартует с ним при нескольких воркерах.
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND',
+            default='django.core.cache.backends.locmem.LocMemCache'
+        ),
+        'LOCATION': os.getenv('CACHE_LOCATION', default='api_yamdb'),
+    },
+    # Роли и статусы пользователей для StatelessJWTAuthentication; не
+    # делит место с кэшем ответов, чтобы не вытесняться им.
+    'auth': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND',
+            default='django.core.cache.backends.locmem.LocMemCache'
+        ),
+        'LOCATION': os.getenv(
+            'AUTH_CACHE_LOCATION', default='api_yamdb-auth'),
+    },
+}
+
+API_CACHE_ALIAS = 'default'
+AUTH_CACHE_ALIAS = 'auth'
+API_CACHE_TIMEOUT = 60 * 15
+# Сколько секунд nginx держит ответ в микрокэше (X-Accel-Expires).
+API_PROXY_CACHE_TTL = 5
+
+# Сколько секунд запись журнала изменений выжидает, прежде чем попасть
+# в /api/v1/changes/: не меньше самой долгой транзакции (таймаут gunicorn).
+CHANGE_FEED_DELAY = int(os.getenv('CHANGE_FEED_DELAY', default=30))
+
+# Metrics
+
+# Адреса и сети, с которых можно читать /metrics/, через запятую:
+# например, сеть docker-compose, из которой Prometheus опрашивает web:8000
+# напрямую. Через nginx /metrics/ закрыт.
+METRICS_ALLOWED_IPS = tuple(filter(None, os.getenv(
+    'METRICS_ALLOWED_IPS', default='127.0.0.1').split(',')))
+# Как часто воркер переносит свои счётчики в общий кэш, в секундах.
+METRICS_FLUSH_INTERVAL = float(os.getenv('METRICS_FLUSH_INTERVAL', default=1))
+
+# Допустимое число SQL-запросов на вьюху (basename-action), сверх него
+# запрос пишется в лог.
+API_DEFAULT_QUERY_BUDGET = 10
+API_QUERY_BUDGETS = {
+    'titles-list': 3,
+    'titles-retrieve': 2,
+    'reviews-list': 3,
+    'comments-list': 3,
+}
 
 # Password validation
 
@@ -127,6 +219,9 @@ EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')
 
 MAILING_EMAIL = 'confirmation_code@gmail.com'
 
+EMAIL_QUEUE_MAX_ATTEMPTS = 5
+EMAIL_QUEUE_RETRY_DELAY = 30
+
 # Permissions
 
 REST_FRAMEWORK = {
@@ -134,11 +229,17 @@ REST_FRAMEWORK = {
         'rest_framework.permissions.IsAuthenticated',
     ],
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'api.authentication.StatelessJWTAuthentication',
     ],
     'DEFAULT_PAGINATION_CLASS':
         'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 5,
+    # Перед Django стоит один nginx, X-Forwarded-For он перезаписывает.
+    'NUM_PROXIES': 1,
+    'DEFAULT_THROTTLE_RATES': {
+        'signup': '10/hour',
+        'signup_email': '3/hour',
+    },
 }
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
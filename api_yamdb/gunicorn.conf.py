@@ -0,0 +1,32 @@
+import multiprocessing
+import os
+
+bind = '0:8000'
+
+# Потоковые воркеры: пока один поток ждёт базу или медленного клиента,
+# остальные потоки процесса продолжают обслуживать запросы.
+worker_class = os.getenv('GUNICORN_WORKER_CLASS', default='gthread')
+# Каждый поток держит постоянное соединение с базой (CONN_MAX_AGE), поэтому
+# по умолчанию не больше 8 * 4 = 32 соединений — с запасом до
+# max_connections = 100 у Postgres. Больше — только через pgbouncer.
+workers = int(os.getenv(
+    'GUNICORN_WORKERS', default=min(multiprocessing.cpu_count() * 2 + 1, 8)
+))
+threads = int(os.getenv('GUNICORN_THREADS', default=4))
+timeout = int(os.getenv('GUNICORN_TIMEOUT', default=30))
+keepalive = int(os.getenv('GUNICORN_KEEPALIVE', default=5))
+
+
+def on_starting(server):
+    """Кэш версий ресурсов и троттлинга должен быть общим для воркеров:
+    с LocMemCache каждый процесс отдавал бы свои устаревшие ответы."""
+    if server.cfg.workers < 2:
+        return
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'api_yamdb.settings')
+    from django.conf import settings
+    for alias, config in settings.CACHES.items():
+        if config['BACKEND'].endswith('.LocMemCache'):
+            raise RuntimeError(
+                f'Cache "{alias}" is per-process LocMemCache; configure '
+                f'a shared CACHE_BACKEND or run a single worker'
+            )
@@ -0,0 +1,53 @@
+from django.core.management import BaseCommand
+
+from reviews.similarity import (GENRE_WEIGHT, TOP_K, SimilarityIndex,
+                                changed_title_ids)
+from titles.models import Title
+
+
+class Command(BaseCommand):
+    help = 'Build the similar titles index'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--top', type=int, default=TOP_K,
+            help='Number of neighbours stored per title',
+        )
+        parser.add_argument(
+            '--genre-weight', type=float, default=GENRE_WEIGHT,
+            help='Weight of genre overlap relative to co-reviewing',
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Titles rewritten per transaction',
+        )
+        parser.add_argument(
+            '--incremental', action='store_true',
+            help='Only rebuild titles whose reviews changed since '
+                 'the last build',
+        )
+
+    def handle(self, *args, **options):
+        index = SimilarityIndex(
+            top=options['top'], genre_weight=options['genre_weight'])
+        title_ids = None
+        if options['incremental']:
+            title_ids = changed_title_ids()
+            if title_ids == []:
+                self.stdout.write('Similar titles index is up to date')
+                return
+        if title_ids is None:
+            title_ids = list(Title.objects.values_list('id', flat=True))
+            index.load()
+        else:
+            index.load(title_ids)
+
+        batch_size = options['batch_size']
+        rows = 0
+        for start in range(0, len(title_ids), batch_size):
+            rows += index.save(title_ids[start:start + batch_size])
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Successfully stored {rows} neighbours '
+            f'for {len(title_ids)} titles'
+        ))
@@ -0,0 +1,124 @@
+import csv
+import os
+import random
+from datetime import datetime, timedelta, timezone
+
+from django.core.management import BaseCommand, CommandError
+
+HEADERS = {
+    'users.csv': (
+        'id', 'username', 'email', 'role', 'bio', 'first_name', 'last_name'
+    ),
+    'category.csv': ('id', 'name', 'slug'),
+    'genre.csv': ('id', 'name', 'slug'),
+    'titles.csv': ('id', 'name', 'year', 'category_id'),
+    'genre_title.csv': ('id', 'title_id', 'genre_id'),
+    'review.csv': (
+        'id', 'title_id', 'text', 'author_id', 'score', 'pub_date'
+    ),
+    'comments.csv': ('id', 'review_id', 'text', 'author_id', 'pub_date'),
+}
+ROLES = ('user',) * 18 + ('moderator', 'admin')
+WORDS = (
+    'фильм', 'книга', 'песня', 'сюжет', 'герой', 'финал', 'автор',
+    'отлично', 'скучно', 'неожиданно', 'рекомендую', 'пересмотрю',
+)
+START = datetime(2015, 1, 1, tzinfo=timezone.utc)
+
+
+class Command(BaseCommand):
+    help = 'Generate synthetic csv files in the load_csv layout'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Output directory')
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--categories', type=int, default=10)
+        parser.add_argument('--genres', type=int, default=50)
+        parser.add_argument('--titles', type=int, default=10000)
+        parser.add_argument('--reviews', type=int, default=100000)
+        parser.add_argument('--comments', type=int, default=200000)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        # Пара (произведение, автор) уникальна, поэтому авторов должно
+        # хватать на все отзывы.
+        if options['reviews'] > options['titles'] * options['users']:
+            raise CommandError('--reviews must not exceed titles * users')
+        if options['reviews'] == 0 and options['comments']:
+            raise CommandError('--comments require --reviews')
+        self.random = random.Random(options['seed'])
+        os.makedirs(options['path'], exist_ok=True)
+        generators = {
+            'users.csv': self.users(options['users']),
+            'category.csv': self.slugs('category', options['categories']),
+            'genre.csv': self.slugs('genre', options['genres']),
+            'titles.csv': self.titles(
+                options['titles'], options['categories']),
+            'genre_title.csv': self.genre_titles(
+                options['titles'], options['genres']),
+            'review.csv': self.reviews(
+                options['reviews'], options['titles'], options['users']),
+            'comments.csv': self.comments(
+                options['comments'], options['reviews'], options['users']),
+        }
+        for base, rows in generators.items():
+            with open(
+                os.path.join(options['path'], base),
+                'w', encoding='utf-8', newline=''
+            ) as csv_file:
+                writer = csv.writer(csv_file)
+                writer.writerow(HEADERS[base])
+                writer.writerows(rows)
+
+        self.stdout.write(self.style.SUCCESS('Successfully generated data'))
+
+    def text(self, words):
+        return ' '.join(self.random.choices(WORDS, k=words)).capitalize()
+
+    def pub_date(self):
+        moment = START + timedelta(seconds=self.random.randrange(10 ** 8))
+        return moment.isoformat(timespec='milliseconds').replace(
+            '+00:00', 'Z')
+
+    def users(self, count):
+        for pk in range(1, count + 1):
+            yield (
+                pk, f'user{pk}', f'user{pk}@yamdb.fake',
+                self.random.choice(ROLES), '', '', ''
+            )
+
+    def slugs(self, prefix, count):
+        for pk in range(1, count + 1):
+            yield pk, f'{prefix.capitalize()} {pk}', f'{prefix}{pk}'
+
+    def titles(self, count, categories):
+        for pk in range(1, count + 1):
+            yield (
+                pk, self.text(3), self.random.randint(1900, 2023),
+                self.random.randint(1, categories)
+            )
+
+    def genre_titles(self, titles, genres):
+        pk = 0
+        for title_id in range(1, titles + 1):
+            count = min(genres, self.random.randint(1, 3))
+            for genre_id in self.random.sample(range(1, genres + 1), count):
+                pk += 1
+                yield pk, title_id, genre_id
+
+    def reviews(self, count, titles, users):
+        # Отзыв i пишет автор i // titles на произведение i % titles:
+        # пары не повторяются, а число отзывов на произведение равномерно.
+        for index in range(count):
+            yield (
+                index + 1, index % titles + 1, self.text(20),
+                index // titles % users + 1, self.random.randint(1, 10),
+                self.pub_date()
+            )
+
+    def comments(self, count, reviews, users):
+        for pk in range(1, count + 1):
+            yield (
+                pk, self.random.randint(1, reviews), self.text(10),
+                self.random.randint(1, users), self.pub_date()
+            )
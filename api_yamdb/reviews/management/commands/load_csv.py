@@ -1,9 +1,19 @@
 import csv
+import json
+import os
+import time
+from contextlib import contextmanager
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from itertools import islice
 
+from django.apps import apps
 from django.conf import settings
-from django.core.management import BaseCommand
+from django.core.management import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import connection, connections, transaction
 
-from reviews.models import Comment, Review
+from api.cache import bump_version
+from reviews.models import Comment, Review, TitleStats
 from titles.models import Category, Genre, Title
 from users.models import User
 
@@ -19,24 +29,284 @@ TABLES_DICT = {
 }
 
 
+def get_dependencies():
+    """Таблицы из TABLES_DICT, на которые ссылается каждая таблица."""
+    return {
+        model: {
+            field.related_model for field in model._meta.concrete_fields
+            if field.is_relation
+            and field.related_model in TABLES_DICT
+            and field.related_model is not model
+        }
+        for model in TABLES_DICT
+    }
+
+
+@contextmanager
+def keep_dates(model, columns):
+    """Отключает auto_now_add у полей, значения которых есть в файле,
+    иначе bulk_create заменит даты из csv текущим временем."""
+    fields = [
+        field for field in model._meta.concrete_fields
+        if getattr(field, 'auto_now_add', False) and field.attname in columns
+    ]
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field in fields:
+            field.auto_now_add = True
+
+
+def close_connections():
+    connections.close_all()
+
+
+def load_chunk(label, number, rows, replay=False):
+    """Загружает пачку строк в отдельном процессе. Конфликты пропускаются
+    только при повторе пачки, которая могла быть зафиксирована до сбоя;
+    иначе дубликаты — ошибка, как и при последовательной загрузке."""
+    model = apps.get_model(label)
+    with keep_dates(model, rows[0]), transaction.atomic():
+        model.objects.bulk_create(
+            (model(**data) for data in rows), ignore_conflicts=replay
+        )
+    return label, number, len(rows)
+
+
 class Command(BaseCommand):
     help = 'Load data from csv files'
 
-    def handle(self, *args, **kwargs):
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--path',
+            default=os.path.join(settings.BASE_DIR, 'static', 'data'),
+            help='Directory with csv files'
+        )
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument(
+            '--copy', action='store_true',
+            help='Use PostgreSQL COPY FROM for tables that allow it'
+        )
+        parser.add_argument(
+            '--workers', type=int, default=1,
+            help='Load independent tables and chunks in N processes'
+        )
+        parser.add_argument(
+            '--checkpoint',
+            help='Checkpoint file for --workers mode '
+                 '(default: .load_csv.json in --path)'
+        )
+
+    def handle(self, *args, **options):
+        if options['workers'] > 1:
+            self.load_parallel(options)
+        else:
+            self.load_sequential(options)
+
+        with transaction.atomic():
+            TitleStats.objects.rebuild()
+        for resource in ('categories', 'genres', 'titles', 'reviews'):
+            bump_version(resource)
+
+        self.stdout.write(self.style.SUCCESS('Successfully load data'))
+
+    def load_sequential(self, options):
         for model, base in TABLES_DICT.items():
-            with open(
-                f'{settings.BASE_DIR}/static/data/{base}',
-                'r', encoding='utf-8'
-            ) as csv_file:
+            path = os.path.join(options['path'], base)
+            start = time.monotonic()
+            if options['copy'] and self.can_copy(model, path):
+                rows = self.copy_table(model, path)
+            else:
+                rows = self.load_table(model, path, options['batch_size'])
+            self.reset_sequence(model)
+            self.report(model, rows, time.monotonic() - start)
+
+    def load_parallel(self, options):
+        """Загружает таблицы волнами: в каждой волне все таблицы, чьи
+        зависимости уже загружены, делятся на пачки и грузятся пулом
+        процессов. Загруженные пачки пишутся в файл чекпоинта, и при
+        повторном запуске пропускаются."""
+        checkpoint_path = options['checkpoint'] or os.path.join(
+            options['path'], '.load_csv.json')
+        self.checkpoint = {
+            'batch_size': options['batch_size'],
+            'files': self.get_files_state(options['path']),
+            'started': {},
+        }
+        done = self.read_checkpoint(checkpoint_path)
+        pending = get_dependencies()
+        # Дочерние процессы открывают собственные соединения.
+        close_connections()
+        with ProcessPoolExecutor(
+            max_workers=options['workers'], initializer=close_connections
+        ) as pool:
+            while pending:
+                wave = [
+                    model for model, dependencies in pending.items()
+                    if not dependencies & set(pending)
+                ]
+                start = time.monotonic()
+                rows = dict.fromkeys(wave, 0)
+                futures = set()
+                window = options['workers'] * 2
+                for chunk in self.read_chunks(wave, options, done):
+                    # Ограничиваем число пачек в очереди, чтобы не держать
+                    # в памяти всю таблицу.
+                    if len(futures) >= window:
+                        finished, futures = wait(
+                            futures, return_when=FIRST_COMPLETED)
+                        self.commit_chunks(finished, done, checkpoint_path,
+                                           rows)
+                    self.mark_started(chunk, window, done, checkpoint_path)
+                    futures.add(pool.submit(load_chunk, *chunk))
+                self.commit_chunks(wait(futures).done, done, checkpoint_path,
+                                   rows)
+                for model in wave:
+                    self.reset_sequence(model)
+                    self.report(model, rows[model], time.monotonic() - start)
+                    del pending[model]
+        if os.path.exists(checkpoint_path):
+            os.remove(checkpoint_path)
+
+    def read_chunks(self, models, options, done):
+        """Пачки строк таблиц, ещё не отмеченные в чекпоинте. Пачки,
+        отправленные в прошлый запуск, но не отмеченные загруженными,
+        повторяются с пропуском конфликтов."""
+        batch_size = options['batch_size']
+        for model in models:
+            label = model._meta.label
+            started = self.checkpoint['started'].get(label, -1)
+            path = os.path.join(options['path'], TABLES_DICT[model])
+            with open(path, 'r', encoding='utf-8', newline='') as csv_file:
                 reader = csv.DictReader(csv_file)
-                if model == Title.genre.through:
-                    objs = []
-                    for data in reader:
-                        title = Title.objects.get(id=data['title_id'])
-                        genre = Genre.objects.get(id=data['genre_id'])
-                        objs.append(model(title=title, genre=genre))
-                    model.objects.bulk_create(objs)
-                else:
-                    model.objects.bulk_create(model(**data) for data in reader)
+                number = 0
+                while True:
+                    rows = list(islice(reader, batch_size))
+                    if not rows:
+                        break
+                    if number not in done.get(label, ()):
+                        yield label, number, rows, number <= started
+                    number += 1
 
-        self.stdout.write(self.style.SUCCESS('Successfully load data'))
+    def mark_started(self, chunk, window, done, checkpoint_path):
+        """Отмечает в чекпоинте отправленные пачки до того, как они
+        могут быть зафиксированы; отметка делается с запасом на window
+        пачек, чтобы не переписывать файл на каждую."""
+        label, number = chunk[:2]
+        started = self.checkpoint['started']
+        if started.get(label, -1) < number:
+            started[label] = max(started.get(label, -1), number + window)
+            self.write_checkpoint(checkpoint_path, done)
+
+    def get_files_state(self, path):
+        files = {}
+        for base in TABLES_DICT.values():
+            stat = os.stat(os.path.join(path, base))
+            files[base] = [stat.st_size, stat.st_mtime_ns]
+        return files
+
+    def commit_chunks(self, futures, done, checkpoint_path, rows):
+        for future in futures:
+            label, number, count = future.result()
+            done.setdefault(label, set()).add(number)
+            rows[apps.get_model(label)] += count
+        self.write_checkpoint(checkpoint_path, done)
+
+    def read_checkpoint(self, path):
+        """Загруженные пачки из чекпоинта. Номера пачек имеют смысл
+        только для тех же --batch-size и файлов, иначе продолжать нельзя."""
+        if not os.path.exists(path):
+            return {}
+        with open(path, 'r', encoding='utf-8') as checkpoint:
+            data = json.load(checkpoint)
+        if (data.get('batch_size') != self.checkpoint['batch_size']
+                or data.get('files') != self.checkpoint['files']):
+            raise CommandError(
+                f'Checkpoint {path} was written for another --batch-size '
+                f'or other csv files; delete it to load from scratch'
+            )
+        self.checkpoint['started'] = data['started']
+        return {
+            label: set(numbers) for label, numbers in data['done'].items()
+        }
+
+    def write_checkpoint(self, path, done):
+        with open(f'{path}.tmp', 'w', encoding='utf-8') as checkpoint:
+            json.dump({
+                **self.checkpoint,
+                'done': {
+                    label: sorted(numbers)
+                    for label, numbers in done.items()
+                },
+            }, checkpoint)
+        os.replace(f'{path}.tmp', path)
+
+    def report(self, model, rows, elapsed):
+        self.stdout.write(
+            f'{model._meta.db_table}: {rows} rows, '
+            f'{rows / elapsed if elapsed else rows:.0f} rows/sec'
+        )
+
+    def load_table(self, model, path, batch_size):
+        """Загружает таблицу пачками, каждую в отдельной транзакции."""
+        rows = 0
+        with open(path, 'r', encoding='utf-8', newline='') as csv_file:
+            reader = csv.DictReader(csv_file)
+            with keep_dates(model, reader.fieldnames or ()):
+                while True:
+                    objs = [
+                        model(**data) for data in islice(reader, batch_size)
+                    ]
+                    if not objs:
+                        break
+                    # Размер запроса bulk_create подбирает сам: SQLite
+                    # ограничивает число параметров и составных SELECT.
+                    with transaction.atomic():
+                        model.objects.bulk_create(objs)
+                    rows += len(objs)
+        return rows
+
+    def read_header(self, path):
+        with open(path, 'r', encoding='utf-8', newline='') as csv_file:
+            return next(csv.reader(csv_file))
+
+    def can_copy(self, model, path):
+        """COPY не заполняет значения по умолчанию из Python, поэтому
+        в файле должны быть все NOT NULL колонки таблицы."""
+        if connection.vendor != 'postgresql':
+            return False
+        columns = {
+            model._meta.get_field(name).column
+            for name in self.read_header(path)
+        }
+        return all(
+            field.null or field.column in columns
+            for field in model._meta.concrete_fields
+        )
+
+    def copy_table(self, model, path):
+        fields = [
+            model._meta.get_field(name) for name in self.read_header(path)
+        ]
+        quote = connection.ops.quote_name
+        columns = ', '.join(quote(field.column) for field in fields)
+        not_null = ', '.join(
+            quote(field.column) for field in fields if not field.null
+        )
+        sql = (
+            f'COPY {quote(model._meta.db_table)} ({columns}) FROM STDIN '
+            f'WITH (FORMAT csv, HEADER true, FORCE_NOT_NULL ({not_null}))'
+        )
+        with open(path, 'r', encoding='utf-8', newline='') as csv_file:
+            with transaction.atomic(), connection.cursor() as cursor:
+                cursor.copy_expert(sql, csv_file)
+                return cursor.rowcount
+
+    def reset_sequence(self, model):
+        """Сдвигает последовательность id после вставки с явными id."""
+        statements = connection.ops.sequence_reset_sql(no_style(), [model])
+        with connection.cursor() as cursor:
+            for sql in statements:
+                cursor.execute(sql)
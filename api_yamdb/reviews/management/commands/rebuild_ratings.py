@@ -0,0 +1,16 @@
+from django.core.management import BaseCommand
+from django.db import transaction
+
+from reviews.models import TitleStats
+
+
+class Command(BaseCommand):
+    help = 'Rebuild title ratings and review statistics'
+
+    def handle(self, *args, **kwargs):
+        with transaction.atomic():
+            stats = TitleStats.objects.rebuild()
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Successfully rebuilt {len(stats)} title stats'
+        ))
@@ -1,5 +1,9 @@
 from django.core.validators import MaxValueValidator, MinValueValidator
 from django.db import models
+from django.db.models import (Count, ExpressionWrapper, F, Q, Sum,
+                              Value)
+from django.db.models.functions import Cast, NullIf
+from django.utils import timezone
 
 from titles.models import Title
 from users.models import User
@@ -31,6 +35,12 @@ class Review(models.Model):
                 name='unique_review'
             ),
         ]
+        indexes = [
+            models.Index(
+                fields=['title', 'pub_date', 'id'],
+                name='review_title_pub_date_idx'
+            ),
+        ]
 
     def __str__(self):
         return f'{self.title}, {self.score}, {self.author}'
@@ -53,6 +63,167 @@ class Comment(models.Model):
         ordering = ['-pub_date', ]
         verbose_name = 'Комментарий'
         verbose_name_plural = 'Комментарии'
+        indexes = [
+            models.Index(
+                fields=['review', 'pub_date', 'id'],
+                name='comment_review_pub_date_idx'
+            ),
+        ]
 
     def __str__(self):
         return self.text[:NUMBER_OF_SIMBOLS]
+
+
+SCORES = range(1, 11)
+
+
+def rating_expression(score_delta, count_delta):
+    """Средняя оценка после изменения суммы и числа отзывов; в UPDATE
+    F() ссылается на значения строки до изменения."""
+    return ExpressionWrapper(
+        Cast(F('score_sum') + score_delta, models.FloatField())
+        / NullIf(F('reviews_count') + count_delta, Value(0)),
+        output_field=models.FloatField(),
+    )
+
+
+class TitleStatsManager(models.Manager):
+    def add_score(self, title_id, score):
+        stats, _ = self.get_or_create(title_id=title_id)
+        self.filter(pk=stats.pk).update(
+            score_sum=F('score_sum') + score,
+            reviews_count=F('reviews_count') + 1,
+            rating=rating_expression(score, 1),
+            scores_updated=timezone.now(),
+            **{f'score_{score}': F(f'score_{score}') + 1},
+        )
+
+    def change_score(self, title_id, old_score, new_score):
+        if old_score == new_score:
+            return
+        self.filter(title_id=title_id).update(
+            score_sum=F('score_sum') + new_score - old_score,
+            rating=rating_expression(new_score - old_score, 0),
+            scores_updated=timezone.now(),
+            **{
+                f'score_{old_score}': F(f'score_{old_score}') - 1,
+                f'score_{new_score}': F(f'score_{new_score}') + 1,
+            },
+        )
+
+    def remove_score(self, title_id, score, comments_count=0):
+        self.filter(title_id=title_id).update(
+            score_sum=F('score_sum') - score,
+            reviews_count=F('reviews_count') - 1,
+            comments_count=F('comments_count') - comments_count,
+            rating=rating_expression(-score, -1),
+            scores_updated=timezone.now(),
+            **{f'score_{score}': F(f'score_{score}') - 1},
+        )
+
+    def add_comment(self, title_id, count=1):
+        stats, _ = self.get_or_create(title_id=title_id)
+        self.filter(pk=stats.pk).update(
+            comments_count=F('comments_count') + count)
+
+    def remove_comment(self, title_id, count=1):
+        self.filter(title_id=title_id).update(
+            comments_count=F('comments_count') - count)
+
+    def rebuild(self):
+        """Пересчитывает статистику всех произведений по отзывам
+        и комментариям."""
+        stats = {
+            row['title_id']: self.model(**row)
+            for row in Review.objects.values('title_id').annotate(
+                score_sum=Sum('score'),
+                reviews_count=Count('id'),
+                **{
+                    f'score_{score}': Count('id', filter=Q(score=score))
+                    for score in SCORES
+                },
+            ).order_by()
+        }
+        comments = Comment.objects.values('review__title_id').annotate(
+            count=Count('id')
+        ).order_by()
+        for row in comments:
+            stats.setdefault(
+                row['review__title_id'],
+                self.model(title_id=row['review__title_id']),
+            ).comments_count = row['count']
+        for title_stats in stats.values():
+            if title_stats.reviews_count:
+                title_stats.rating = (
+                    title_stats.score_sum / title_stats.reviews_count)
+        self.all().delete()
+        return self.bulk_create(stats.values())
+
+
+class TitleStats(models.Model):
+    """Денормализованные рейтинг и счётчики произведения."""
+    title = models.OneToOneField(
+        Title, on_delete=models.CASCADE, primary_key=True,
+        related_name='stats', verbose_name='произведение')
+    score_sum = models.PositiveIntegerField(
+        verbose_name='Сумма оценок', default=0)
+    reviews_count = models.PositiveIntegerField(
+        verbose_name='Количество отзывов', default=0, db_index=True)
+    comments_count = models.PositiveIntegerField(
+        verbose_name='Количество комментариев', default=0)
+    rating = models.FloatField(
+        verbose_name='Рейтинг', null=True, db_index=True)
+    score_1 = models.PositiveIntegerField(default=0)
+    score_2 = models.PositiveIntegerField(default=0)
+    score_3 = models.PositiveIntegerField(default=0)
+    score_4 = models.PositiveIntegerField(default=0)
+    score_5 = models.PositiveIntegerField(default=0)
+    score_6 = models.PositiveIntegerField(default=0)
+    score_7 = models.PositiveIntegerField(default=0)
+    score_8 = models.PositiveIntegerField(default=0)
+    score_9 = models.PositiveIntegerField(default=0)
+    score_10 = models.PositiveIntegerField(default=0)
+    scores_updated = models.DateTimeField(
+        verbose_name='Изменение отзывов', auto_now_add=True, db_index=True)
+
+    objects = TitleStatsManager()
+
+    class Meta:
+        verbose_name = 'Статистика произведения'
+        verbose_name_plural = 'Статистика произведений'
+
+    def __str__(self):
+        return f'{self.title_id}, {self.rating}'
+
+    @property
+    def scores(self):
+        """Число отзывов с каждой оценкой от 1 до 10."""
+        return {score: getattr(self, f'score_{score}') for score in SCORES}
+
+
+class SimilarTitle(models.Model):
+    """Предрассчитанный сосед произведения в индексе похожих."""
+    title = models.ForeignKey(
+        Title, on_delete=models.CASCADE, related_name='similar_titles',
+        verbose_name='произведение')
+    similar = models.ForeignKey(
+        Title, on_delete=models.CASCADE, related_name='+',
+        verbose_name='похожее произведение')
+    rank = models.PositiveSmallIntegerField(verbose_name='Место')
+    score = models.FloatField(verbose_name='Сходство')
+    built = models.DateTimeField(
+        verbose_name='Дата расчёта', default=timezone.now, db_index=True)
+
+    class Meta:
+        ordering = ['title', 'rank']
+        verbose_name = 'Похожее произведение'
+        verbose_name_plural = 'Похожие произведения'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['title', 'rank'],
+                name='unique_similar_title_rank'
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.title_id}, {self.similar_id}, {self.score}'
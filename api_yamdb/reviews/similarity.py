@@ -0,0 +1,131 @@
+"""Индекс похожих произведений.
+
+Сходство двух произведений — косинус между их векторами авторов отзывов
+плюс взвешенный коэффициент Жаккара по жанрам. Матрицы «автор ×
+произведение» и «жанр × произведение» сильно разрежены, поэтому их
+произведение считается по спискам смежности: для произведения
+перебираются только те, что рецензировали те же авторы, и самые
+популярные произведения тех же жанров.
+"""
+import heapq
+import math
+from collections import Counter, defaultdict
+
+from django.db import transaction
+from django.utils import timezone
+
+from titles.models import Title
+
+from .models import Review, SimilarTitle, TitleStats
+
+TOP_K = 20
+GENRE_WEIGHT = 0.3
+# Авторы с сотнями отзывов почти не несут сигнала о сходстве,
+# а перебор пар для них растёт квадратично.
+MAX_AUTHOR_REVIEWS = 500
+GENRE_CANDIDATES = 200
+CHUNK_SIZE = 10000
+
+
+class SimilarityIndex:
+    """Считает top-K соседей произведений по отзывам и жанрам."""
+
+    def __init__(self, top=TOP_K, genre_weight=GENRE_WEIGHT,
+                 max_author_reviews=MAX_AUTHOR_REVIEWS):
+        self.top = top
+        self.genre_weight = genre_weight
+        self.max_author_reviews = max_author_reviews
+        self.started = timezone.now()
+
+    def load(self, title_ids=None):
+        """Читает отзывы и жанры. Если переданы title_ids, загружаются
+        только отзывы авторов, рецензировавших эти произведения."""
+        targets = None if title_ids is None else set(title_ids)
+        reviews = Review.objects.order_by()
+        if targets is not None:
+            reviews = reviews.filter(author_id__in=Review.objects.filter(
+                title_id__in=targets).values('author_id'))
+        self.title_authors = defaultdict(list)
+        self.author_titles = defaultdict(list)
+        for title_id, author_id in reviews.values_list(
+                'title_id', 'author_id').iterator(chunk_size=CHUNK_SIZE):
+            self.author_titles[author_id].append(title_id)
+            if targets is None or title_id in targets:
+                self.title_authors[title_id].append(author_id)
+
+        self.reviews_count = dict(
+            TitleStats.objects.filter(reviews_count__gt=0).values_list(
+                'title_id', 'reviews_count').iterator(chunk_size=CHUNK_SIZE))
+
+        self.title_genres = defaultdict(set)
+        genre_titles = defaultdict(list)
+        for title_id, genre_id in Title.genre.through.objects.values_list(
+                'title_id', 'genre_id').iterator(chunk_size=CHUNK_SIZE):
+            self.title_genres[title_id].add(genre_id)
+            genre_titles[genre_id].append(title_id)
+        self.genre_popular = {
+            genre_id: heapq.nlargest(
+                GENRE_CANDIDATES, titles,
+                key=lambda title_id: self.reviews_count.get(title_id, 0))
+            for genre_id, titles in genre_titles.items()
+        }
+        return self
+
+    def neighbours(self, title_id):
+        """Список пар (сходство, id) по убыванию сходства."""
+        shared = Counter()
+        for author_id in self.title_authors.get(title_id, ()):
+            titles = self.author_titles[author_id]
+            if len(titles) <= self.max_author_reviews:
+                shared.update(titles)
+        genres = self.title_genres.get(title_id, set())
+        for genre_id in genres:
+            for other in self.genre_popular[genre_id]:
+                shared[other] += 0
+        shared.pop(title_id, None)
+
+        count = self.reviews_count.get(title_id, 0)
+        scores = []
+        for other, common in shared.items():
+            score = 0.0
+            if common:
+                score = common / math.sqrt(
+                    max(count, common)
+                    * max(self.reviews_count.get(other, 0), common))
+            other_genres = self.title_genres.get(other, set())
+            if genres or other_genres:
+                score += self.genre_weight * (
+                    len(genres & other_genres) / len(genres | other_genres))
+            if score > 0:
+                scores.append((score, -other))
+        return [
+            (score, -other)
+            for score, other in heapq.nlargest(self.top, scores)
+        ]
+
+    def save(self, title_ids):
+        """Заменяет соседей переданных произведений одной транзакцией."""
+        rows = [
+            SimilarTitle(
+                title_id=title_id, similar_id=other, rank=rank,
+                score=score, built=self.started,
+            )
+            for title_id in title_ids
+            for rank, (score, other) in enumerate(
+                self.neighbours(title_id), 1)
+        ]
+        with transaction.atomic():
+            SimilarTitle.objects.filter(title_id__in=title_ids).delete()
+            SimilarTitle.objects.bulk_create(rows)
+        return len(rows)
+
+
+def changed_title_ids():
+    """Произведения, отзывы на которые менялись после последнего расчёта;
+    None, если индекс ещё не строился."""
+    built = SimilarTitle.objects.order_by('-built').values_list(
+        'built', flat=True).first()
+    if built is None:
+        return None
+    return list(TitleStats.objects.filter(
+        scores_updated__gt=built).values_list('title_id', flat=True))
@@ -0,0 +1,19 @@
+#!/bin/sh
+# Проверка микрокэша nginx: docker-compose up -d, затем ./nginx/test_cache.sh
+# Второй анонимный запрос должен вернуть X-Cache-Status: HIT, запрос
+# с заголовком Authorization — идти мимо кэша.
+set -e
+
+URL=${1:-http://127.0.0.1/api/v1/titles/}
+
+status() {
+    curl -s -o /dev/null -D - "$@" | tr -d '\r' \
+        | awk -F': ' 'tolower($1) == "x-cache-status" {print $2}'
+}
+
+status "$URL" > /dev/null
+hit=$(status "$URL")
+bypass=$(status -H 'Authorization: Bearer test' "$URL")
+
+echo "anonymous: $hit, authorized: $bypass"
+[ "$hit" = "HIT" ] && [ "$bypass" = "BYPASS" ]